@@ -0,0 +1,105 @@
+# budget_catalogs.py
+# Dimension catalogs (Entity / CostCenter / Asset): file loading, hashed membership, prefix search
+
+import io
+
+import numpy as np
+import pandas as pd
+
+CATALOG_DIMS = ["Entity", "CostCenter", "Asset"]
+MAX_OPTIONS = 200  # options sent to an editor column at most
+
+def parse_catalog_text(text):
+    """One value per line; blanks dropped."""
+    return [x.strip() for x in str(text).splitlines() if x.strip()]
+
+def read_catalog_file(data, file_name, dim=None):
+    """Catalog values from an uploaded .txt/.csv/.xlsx (bytes).
+
+    Tables use the column named after `dim` when present, else the first column.
+    """
+    name = file_name.lower()
+    if name.endswith(".txt"):
+        return parse_catalog_text(data.decode("utf-8-sig"))
+    if name.endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    else:
+        df = pd.read_excel(io.BytesIO(data), dtype=str)
+    if df.empty and not len(df.columns):
+        return []
+    col = dim if dim in df.columns else df.columns[0]
+    return df[col].dropna().astype(str).str.strip().tolist()
+
+class Catalog:
+    """Allowed values of one dimension.
+
+    Membership goes through a hashed index (pd.Index), searches through a sorted,
+    case-folded copy so a prefix lookup is two binary searches.
+    """
+
+    def __init__(self, name, values):
+        self.name = name
+        values = pd.Series(list(values), dtype=object).dropna().astype(str).str.strip()
+        values = np.unique(np.asarray(values[values != ""], dtype=str))
+        self.values = values
+        self.index = pd.Index(values, dtype=object)
+        folded = np.char.lower(values)
+        self._order = np.argsort(folded, kind="stable")
+        self._folded = folded[self._order]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self.index
+
+    def contains(self, values):
+        """Vectorized membership -> bool array."""
+        values = np.asarray(values, dtype=object)
+        if not len(values):
+            return np.zeros(0, dtype=bool)
+        return self.index.get_indexer(values.astype(str)) >= 0
+
+    def search(self, text="", limit=MAX_OPTIONS):
+        """Up to `limit` values starting with `text` (case-insensitive), sorted."""
+        text = str(text).strip().lower()
+        if not text:
+            return self.values[:limit].tolist()
+        lo = np.searchsorted(self._folded, text, side="left")
+        hi = np.searchsorted(self._folded, text + "\U0010ffff", side="left")
+        hits = np.sort(self._order[lo:min(hi, lo + limit)])
+        return self.values[hits].tolist()
+
+    def options(self, text="", keep=(), limit=MAX_OPTIONS):
+        """Bounded editor options: search hits plus `keep` (values already in the grid)."""
+        if len(self) <= limit and not text:
+            base = self.values.tolist()
+        else:
+            base = self.search(text, limit)
+        listed = set(base)
+        extra = [v for v in dict.fromkeys(keep) if v and v not in listed]
+        return base + extra
+
+def unknown_values(links, catalogs):
+    """Links rows (Dim, Row, Value) whose value is not in that dim's catalog."""
+    if links is None or links.empty:
+        return links
+    bad = np.zeros(len(links), dtype=bool)
+    dims = links["Dim"].to_numpy()
+    values = links["Value"].to_numpy(dtype=object)
+    for dim, catalog in catalogs.items():
+        mask = dims == dim
+        if mask.any():
+            bad[mask] = ~catalog.contains(values[mask])
+    return links[bad]
+
+def catalog_issues(links, catalogs):
+    """{dim: [(value, [1-based rows])]} for values missing from the catalogs."""
+    issues = {}
+    bad = unknown_values(links, catalogs)
+    if bad is None or bad.empty:
+        return issues
+    grouped = bad.groupby(["Dim", "Value"], sort=True)["Row"].agg(lambda r: sorted(int(x) + 1 for x in r))
+    for (dim, value), rows in grouped.items():
+        issues.setdefault(dim, []).append((value, rows))
+    return issues
@@ -1,108 +1,163 @@
 import streamlit as st
 import pandas as pd
+import altair as alt
 from datetime import datetime
 
+from budget_engine import BudgetCube, TREND_STATS, rolling_metrics, waterfall_frame
+from budget_io import download_widget
+from budget_store import open_store
+from budget_tables import month_windows, stacked_display, style_stacked
+
 st.set_page_config(page_title="Budget Dashboard", layout="wide")
 
 st.title("📊 Budget Dashboard (Budgets • Versions • Items)")
 
-# ---------- Sample Data ----------
+# ---------- Data (local budget store) ----------
+@st.cache_resource
+def get_store():
+    # Saved budgets/versions; seeded with budget_engine.generate_sample_data on first run
+    return open_store()
+
+# Changes on every save, so the cube and cached queries are rebuilt
+DATA_VERSION = get_store().data_version()
+
+@st.cache_resource
+def load_cube(data_version):
+    # Dense Budget/Version/Item/Month aggregates, built once per dataset version
+    return BudgetCube(get_store().load())
+
+@st.cache_data
+def version_comparison(data_version, budget, base, target, month_from, month_to, items, metric):
+    # Item × Month deltas, cached per (budget, version pair) and filters
+    return load_cube(data_version).compare_versions(budget, base, target, month_from, month_to, items, metric)
+
+@st.cache_data
+def version_steps(data_version, budget, month_from, month_to, items, metric):
+    return load_cube(data_version).version_steps(budget, month_from, month_to, items, metric)
+
 @st.cache_data
-def generate_sample_data():
-    budgets = ["Company", "Project A", "Project B"]
-    versions = [f"V{i}" for i in range(1, 11)]  # V1..V10
-    months = pd.date_range("2024-01-01", "2025-12-01", freq="MS")
-    items = ["Rentals", "Fuel", "Construction", "Salaries", "Marketing", "Equipment"]
-
-    rows = []
-    for budget in budgets:
-        for version in versions:
-            for item in items:
-                for m in months:
-                    # deterministic pseudo-random numbers by hashing keys
-                    base = 8000 + (abs(hash(f"{budget}-{item}")) % 6000)
-                    v_adj = (int(version[1:]) - 5) * 250  # version shift
-                    season = (m.month % 6) * 150  # seasonality
-                    planned = max(1000, base + v_adj + season)
-                    jitter = ((abs(hash(f"{budget}-{version}-{item}-{m}")) % 21) - 10) / 100.0  # -10%..+10%
-                    actual = int(planned * (1 + jitter))
-                    rows.append({
-                        "Budget": budget,
-                        "Version": version,
-                        "Item": item,
-                        "Month": m,
-                        "Planned": int(planned),
-                        "Actual": int(actual)
-                    })
-    df = pd.DataFrame(rows)
-    return df
-
-df = generate_sample_data()
+def trend_metrics(data_version, pins, items):
+    # Rolling/YTD/run-rate over the full month history of the selection (pins = ((budget, version), ...))
+    return rolling_metrics(load_cube(data_version).rollup(dict(pins), items=items))
+
+cube = load_cube(DATA_VERSION)
 
 # ---------- Sidebar Filters ----------
 st.sidebar.header("Filters")
 
-# 1) Choose Budget
-budget_options = sorted(df["Budget"].unique())
-selected_budget = st.sidebar.selectbox("🏷️ Budget", budget_options, index=0)
-
-# 2) Choose Version (filtered by Budget)
-vers_for_budget = sorted(df.loc[df["Budget"] == selected_budget, "Version"].unique(),
-                         key=lambda v: int(v[1:]), reverse=True)
-selected_version = st.sidebar.selectbox("📄 Version", vers_for_budget, index=0)
+# 0) One budget, or many budgets rolled up into a consolidated view
+mode = st.sidebar.radio("🧮 Mode", ["Single budget", "Consolidated"], index=0, horizontal=True)
+consolidated = mode == "Consolidated"
+budget_options = list(cube.budgets)
+
+if not consolidated:
+    # 1) Choose Budget
+    selected_budget = st.sidebar.selectbox("🏷️ Budget", budget_options, index=0)
+
+    # 2) Choose Version (filtered by Budget)
+    vers_for_budget = cube.versions_for(selected_budget)  # newest first
+    selected_version = st.sidebar.selectbox("📄 Version", vers_for_budget, index=0)
+
+    min_month, max_month = (m.date() for m in cube.month_bounds(selected_budget, selected_version))
+    all_items = cube.items_for(selected_budget, selected_version)
+else:
+    # 1) Choose Budgets, 2) pin each one to a version (latest by default)
+    selected_budgets = st.sidebar.multiselect("🏷️ Budgets", budget_options, default=budget_options)
+    if not selected_budgets:
+        st.info("Select at least one budget to consolidate.")
+        st.stop()
+    latest = cube.latest_versions(selected_budgets)
+    with st.sidebar.expander(f"📌 Pinned versions ({len(latest)})"):
+        pins_df = st.data_editor(
+            pd.DataFrame({"Budget": list(latest), "Version": list(latest.values())}),
+            column_config={
+                "Budget": st.column_config.TextColumn("Budget", disabled=True),
+                "Version": st.column_config.SelectboxColumn("Version", options=list(cube.versions), required=True),
+            },
+            hide_index=True,
+            use_container_width=True,
+            key="pinned_versions_" + "|".join(selected_budgets),  # fresh pins per budget selection
+        )
+    # The editor offers every version; a pin must be one the budget actually has
+    pins, unknown_pins = {}, []
+    for budget, version in zip(pins_df["Budget"], pins_df["Version"]):
+        if version in cube.versions_for(budget):
+            pins[budget] = version
+        else:
+            pins[budget] = latest[budget]
+            unknown_pins.append(f"{budget} has no {version}")
+    if unknown_pins:
+        st.sidebar.warning("Using the latest version instead: " + "; ".join(unknown_pins))
+    min_month, max_month, all_items = cube.coverage(pins)
+    if pd.isna(min_month) or pd.isna(max_month):
+        st.info("The pinned versions have no data.")
+        st.stop()
+    min_month, max_month = min_month.date(), max_month.date()
 
 # 3) Date Range (bounded by available data)
-df_bv = df[(df["Budget"] == selected_budget) & (df["Version"] == selected_version)]
-min_month, max_month = df_bv["Month"].min().date(), df_bv["Month"].max().date()
 col_from, col_to = st.sidebar.columns(2)
 from_date = col_from.date_input("📅 From", min_month, min_value=min_month, max_value=max_month)
 to_date = col_to.date_input("📅 To", max_month, min_value=min_month, max_value=max_month)
 
 # 4) Items filter
-all_items = sorted(df_bv["Item"].unique())
 selected_items = st.sidebar.multiselect("🧩 Items (categories)", all_items, default=all_items)
 
 # 5) Metric to chart
 metric_choice = st.sidebar.radio("📈 Chart metric", ["Planned", "Actual"], index=0)
 
 # ---------- Apply Filters ----------
-filtered = df_bv[
-    (df_bv["Month"] >= pd.to_datetime(from_date)) &
-    (df_bv["Month"] <= pd.to_datetime(to_date)) &
-    (df_bv["Item"].isin(selected_items))
-].copy()
+# Aggregates for the views come from the cube (indexing, no regrouping)
+if not consolidated:
+    pins = {selected_budget: selected_version}
+    sel = cube.slice(selected_budget, selected_version, from_date, to_date, selected_items)
+    heading, export_name = f"{selected_budget} • {selected_version}", f"{selected_budget}_{selected_version}"
+else:
+    sel = cube.rollup(pins, from_date, to_date, selected_items)
+    heading, export_name = f"Consolidated • {len(pins)} budgets", "consolidated"
 
-st.subheader(f"📁 {selected_budget} • {selected_version}  ({from_date} → {to_date})")
+no_data = sel.empty or not cube.has_rows(pins, from_date, to_date, selected_items)
 
-# ---------- Charts ----------
-tab1, tab2, tab3 = st.tabs(["By Item over Time", "Totals over Time", "Table & KPIs"])
+st.subheader(f"📁 {heading}  ({from_date} → {to_date})")
 
-with tab1:
+# ---------- Charts ----------
+def waterfall_chart(wf, metric, title):
+    return alt.Chart(wf).mark_bar().encode(
+        x=alt.X("Step:N", sort=None, title=None),
+        y=alt.Y("Start:Q", title=metric),
+        y2="End:Q",
+        color=alt.Color("Kind:N", scale=alt.Scale(domain=["Total", "Increase", "Decrease"],
+                                                  range=["#64748b", "#16a34a", "#dc2626"])),
+        tooltip=["Step", alt.Tooltip("Delta:Q", format=",.0f")],
+    ).properties(height=320, title=title)
+
+# A selector instead of st.tabs: Streamlit runs every tab body on each rerun,
+# here only the visible view is computed and sent to the browser.
+VIEWS = ["By Item over Time", "Totals over Time", "Table & KPIs", "Trends", "Version Compare"]
+view = st.radio("View", VIEWS, index=0, horizontal=True, label_visibility="collapsed", key="view")
+
+if view == "By Item over Time":
     st.markdown("#### Items vs Month")
-    if filtered.empty:
+    if no_data:
         st.info("No data for the selected filters.")
     else:
         # pivot: rows = Month, columns = Item, values = metric
-        pivot_items = filtered.pivot_table(index="Month", columns="Item", values=metric_choice, aggfunc="sum")
+        pivot_items = sel.item_month(metric_choice)
         st.line_chart(pivot_items)
 
-with tab2:
+elif view == "Totals over Time":
     st.markdown("#### Overall Planned vs Actual")
-    if filtered.empty:
+    if no_data:
         st.info("No data for the selected filters.")
     else:
-        by_month = filtered.groupby("Month")[["Planned", "Actual"]].sum().sort_index()
+        by_month = sel.by_month()
         st.line_chart(by_month)
 
-with tab3:
+elif view == "Table & KPIs":
     st.markdown("#### Breakdown by Item (Totals)")
-    if filtered.empty:
+    if no_data:
         st.info("No data for the selected filters.")
     else:
-        summary = (filtered
-                   .groupby("Item")[["Planned", "Actual"]]
-                   .sum()
-                   .reset_index())
+        summary = sel.by_item()
         summary["Variance"] = summary["Actual"] - summary["Planned"]
         summary["Variance %"] = (summary["Variance"] / summary["Planned"]).replace([pd.NA, pd.NaT, float("inf")], 0) * 100
 
@@ -128,10 +183,25 @@ with tab3:
         c3.metric("Variance %", f"{variance_pct:.2f}%")
         c4.metric("Items Count", f"{len(selected_items)}")
 
+        # Trend KPIs as of the last month in range (all selected items)
+        trends = trend_metrics(DATA_VERSION, tuple(pins.items()), tuple(selected_items))
+        as_of = trends.loc[:pd.Timestamp(to_date)].iloc[-1]
+        st.markdown(f"#### Trends (as of {as_of.name:%Y-%m})")
+        t1, t2, t3, t4 = st.columns(4)
+        t1.metric("Trailing 12M Actual", f"{as_of['T12M', 'Actual', 'Total']:,.0f} EGP",
+                  delta=f"{as_of['T12M', 'Variance', 'Total']:,.0f} vs plan")
+        t2.metric("YTD Actual", f"{as_of['YTD', 'Actual', 'Total']:,.0f} EGP",
+                  delta=f"{as_of['YTD', 'Variance', 'Total']:,.0f} vs plan")
+        mom = as_of["MoM", "Actual", "Total"]
+        t3.metric("Actual MoM", "-" if pd.isna(mom) else f"{mom:,.0f} EGP",
+                  delta=None if pd.isna(as_of["MoM %", "Actual", "Total"]) else f"{as_of['MoM %', 'Actual', 'Total']:.2f}%")
+        t4.metric("Run-rate (year)", f"{as_of['Run-rate', 'Actual', 'Total']:,.0f} EGP",
+                  delta=f"{as_of['Run-rate', 'Actual', 'Total'] - as_of['Run-rate', 'Planned', 'Total']:,.0f} vs plan")
+
     # --- REPLACED: Monthly breakdown by item (stacked rows with merged item + Variance %) ---
     st.markdown("#### Monthly Breakdown by Item (stacked rows, merged item label + Variance %)")
 
-    if filtered.empty:
+    if no_data:
         st.info("No data for the selected filters.")
     else:
         metric_options = ["Planned", "Actual", "Variance", "Variance %"]
@@ -145,111 +215,109 @@ with tab3:
         if not metrics_selected:
             st.warning("Select at least one metric to display.")
         else:
-            # Build monthly sums and compute Variance + Variance %
-            monthly = (
-                filtered.groupby(["Item", "Month"])[["Planned", "Actual"]]
-                .sum()
-                .reset_index()
-                .sort_values(["Item", "Month"])
-            )
-            monthly["Variance"] = monthly["Actual"] - monthly["Planned"]
-            # Variance % = (Actual - Planned) / Planned * 100, safe for zero planned
-            monthly["Variance %"] = (monthly["Variance"] / monthly["Planned"]).where(monthly["Planned"] != 0).mul(100)
-
-            # Keep user-selected order for stacked metrics
-            cat = pd.api.types.CategoricalDtype(categories=metrics_selected, ordered=True)
-
-            long = monthly.melt(
-                id_vars=["Item", "Month"],
-                value_vars=metrics_selected,
-                var_name="Metric",
-                value_name="Amount",
-            )
-            long["Metric"] = long["Metric"].astype(cat)
-
-            # Wide for display: rows = (Item, Metric), columns = months
-            table = (
-                long.pivot_table(
-                    index=["Item", "Metric"],
-                    columns="Month",
-                    values="Amount",
-                    aggfunc="sum",
-                )
-                .sort_index()
-            )
-
-            # Pretty month headers
-            if table.shape[1] > 0:
-                table.columns = [c.strftime("%Y-%m") for c in table.columns]
-
-            # Reset index so we can "merge" the item label by blanking consecutive repeats
-            table_disp = table.reset_index()
-
-            # Show the item only on the first metric row of each item group
-            is_first_of_group = table_disp["Item"].ne(table_disp["Item"].shift())
-            table_disp["Item"] = table_disp["Item"].where(is_first_of_group, "")
-
-            # Format numbers: percent for "Variance %", thousands for others
-            month_cols = [c for c in table_disp.columns if c not in ["Item", "Metric"]]
-            # Create a display copy with strings for pretty formatting
-            table_show = table_disp.copy()
-            for col in month_cols:
-                # Percent rows
-                mask_pct = table_show["Metric"] == "Variance %"
-                table_show.loc[mask_pct, col] = table_show.loc[mask_pct, col].apply(
-                    lambda v: "-" if pd.isna(v) else f"{float(v):.2f}%"
-                )
-                # Numeric rows
-                mask_num = ~mask_pct
-                table_show.loc[mask_num, col] = table_show.loc[mask_num, col].apply(
-                    lambda v: "-" if pd.isna(v) else f"{int(round(float(v))):,}"
-                )
-
-            # Styling: color text by metric on the month columns
-            color_map = {
-                "Planned": "#1f77b4",    # blue
-                "Actual": "#2ca02c",     # green
-                "Variance": "#d62728",   # red
-                "Variance %": "#9467bd", # purple
-            }
-            ncols = table_show.shape[1]
-
-            def color_by_metric_row(row):
-                color = color_map.get(row["Metric"])
-                styles = []
-                for col in table_show.columns:
-                    if col in month_cols and color:
-                        styles.append(f"color: {color}; font-weight:600")
-                    else:
-                        styles.append("")
-                return styles
-
-            def bold_first_item_row(row):
-                if row["Item"]:
-                    styles = [""] * ncols
-                    styles[table_show.columns.get_loc("Item")] = "font-weight:700"
-                    return styles
-                return [""] * ncols
-
-            styled = (
-                table_show.style
-                .apply(color_by_metric_row, axis=1)
-                .apply(bold_first_item_row, axis=1)
-            )
-
-            st.dataframe(styled, use_container_width=True)
-
-            # Download (long format) for Excel/Sheets — Variance % as numeric percent
-            csv = long.sort_values(["Item", "Metric", "Month"]).to_csv(index=False).encode("utf-8")
-            st.download_button(
-                "⬇️ Download monthly stacked breakdown (CSV)",
-                csv,
-                file_name=f"monthly_stacked_{selected_budget}_{selected_version}.csv",
-                mime="text/csv",
+            # Wide for display: rows = (Item, Metric) in the selected metric order, columns = months
+            table = sel.stacked(metrics_selected)
+
+            # Wide month ranges are shown one window (year) at a time
+            windows = month_windows(sel.months)
+            window = windows[0][1] if windows else slice(None)
+            if len(windows) > 1:
+                labels = [label for label, _ in windows]
+                window_label = st.select_slider("Months shown", options=labels, value=labels[0])
+                window = dict(windows)[window_label]
+
+            # Strings built in one vectorized pass; colors applied per metric row block
+            table_show, month_cols = stacked_display(table, window)
+            st.dataframe(style_stacked(table_show, month_cols), use_container_width=True)
+
+            # Download (long format) for Excel/Sheets — Variance % as numeric percent; built on request only
+            download_widget(
+                "⬇️ Download monthly stacked breakdown",
+                lambda: sel.to_long(metrics_selected),
+                file_stem=f"monthly_stacked_{export_name}",
+                key="dl_stacked",
             )
 
             st.caption("Colors — Planned: blue, Actual: green, Variance: red, Variance %: purple. Note: tables don’t support true row-spans; item label is shown on the first metric row only.")
 
+elif view == "Trends":
+    st.markdown("#### Rolling 12M, YTD and run-rate by item")
+    if no_data:
+        st.info("No data for the selected filters.")
+    else:
+        STAT_LABELS = {"T12M": "Trailing 12 months", "YTD": "Year to date", "MoM": "Month-over-month change",
+                       "MoM %": "Month-over-month change %", "Run-rate": "Run-rate projection (year)"}
+        ct1, ct2 = st.columns(2)
+        stat = ct1.selectbox("Statistic", TREND_STATS, format_func=STAT_LABELS.get, key="trend_stat")
+        measure = ct2.radio("Measure", ["Planned", "Actual", "Variance"], horizontal=True,
+                            index=["Planned", "Actual"].index(metric_choice))
+        trends = trend_metrics(DATA_VERSION, tuple(pins.items()), tuple(selected_items))
+        window = trends[stat][measure].loc[pd.Timestamp(from_date):pd.Timestamp(to_date)]
+        show_total = st.checkbox("Show all-items total", value=False)
+        st.line_chart(window if show_total else window.drop(columns="Total"))
+
+        last = window.iloc[-1].rename(f"{stat} @ {window.index[-1]:%Y-%m}").to_frame()
+        fmt = "{:.2f}%" if stat == "MoM %" else "{:,.0f}"
+        st.dataframe(last.style.format(fmt, na_rep="-"), use_container_width=True)
+
+elif view == "Version Compare":
+    st.markdown(f"#### {metric_choice}: version over version")
+    compare_mode = st.radio("Compare", ["Two versions", "All consecutive versions"], horizontal=True, key="compare_mode")
+
+    if consolidated:
+        st.info("Version comparison works on a single budget — switch Mode to 'Single budget'.")
+    elif no_data:
+        st.info("No data for the selected filters.")
+    elif compare_mode == "Two versions":
+        older = vers_for_budget[1:] or vers_for_budget
+        cb, ct = st.columns(2)
+        base_version = cb.selectbox("Base version", vers_for_budget, index=vers_for_budget.index(older[0]))
+        target_version = ct.selectbox("Target version", vers_for_budget, index=vers_for_budget.index(selected_version))
+
+        cmp = version_comparison(DATA_VERSION, selected_budget, base_version, target_version,
+                                 from_date, to_date, tuple(selected_items), metric_choice)
+        by_item = cmp.groupby("Item", sort=False)["Delta"].sum()
+        base_total, target_total = float(cmp["Base"].sum()), float(cmp["Target"].sum())
+
+        c1, c2, c3 = st.columns(3)
+        c1.metric(f"{base_version} total", f"{base_total:,.0f} EGP")
+        c2.metric(f"{target_version} total", f"{target_total:,.0f} EGP", delta=f"{target_total - base_total:,.0f} EGP")
+        c3.metric("Cells changed", f"{int((cmp['Delta'] != 0).sum()):,} / {len(cmp):,}")
+
+        # Waterfall: base total -> per-item deltas -> target total
+        wf = waterfall_frame(base_version, base_total, by_item, target_version)
+        st.altair_chart(waterfall_chart(wf, metric_choice, f"{base_version} → {target_version} by item"),
+                        use_container_width=True)
+
+        heat = alt.Chart(cmp).mark_rect().encode(
+            x=alt.X("yearmonth(Month):O", title=None),
+            y=alt.Y("Item:N", title=None),
+            color=alt.Color("Delta:Q", scale=alt.Scale(scheme="redblue", domainMid=0)),
+            tooltip=["Item", alt.Tooltip("yearmonth(Month):T", title="Month"),
+                     alt.Tooltip("Base:Q", format=",.0f"), alt.Tooltip("Target:Q", format=",.0f"),
+                     alt.Tooltip("Delta:Q", format=",.0f")],
+        ).properties(height=max(160, 28 * cmp["Item"].nunique()), title="Delta by item and month")
+        st.altair_chart(heat, use_container_width=True)
+    else:
+        versions, steps = version_steps(DATA_VERSION, selected_budget, from_date, to_date,
+                                        tuple(selected_items), metric_choice)
+        if len(versions) < 2:
+            st.info("This budget has a single version.")
+        else:
+            first_total = float(cube.slice(selected_budget, versions[0], from_date, to_date,
+                                           selected_items).metric(metric_choice).sum())
+            per_step = steps.assign(Step=steps["From"] + "→" + steps["To"]).groupby("Step", sort=False)["Delta"].sum()
+            wf = waterfall_frame(versions[0], first_total, per_step, versions[-1])
+            st.altair_chart(waterfall_chart(wf, metric_choice, f"{versions[0]} → {versions[-1]} by version step"),
+                            use_container_width=True)
+
+            heat = alt.Chart(steps).mark_rect().encode(
+                x=alt.X("To:N", sort=versions[1:], title="Step into version"),
+                y=alt.Y("Item:N", title=None),
+                color=alt.Color("Delta:Q", scale=alt.Scale(scheme="redblue", domainMid=0)),
+                tooltip=["From", "To", "Item", alt.Tooltip("Delta:Q", format=",.0f")],
+            ).properties(height=max(160, 28 * steps["Item"].nunique()), title="Delta by item and version step")
+            st.altair_chart(heat, use_container_width=True)
 
 # ---------- Notes ----------
 st.caption("Tip: Use the Items filter to focus on specific categories. Switch the chart metric to compare Planned vs Actual per item.")
@@ -0,0 +1,340 @@
+# budget_engine.py
+# Vectorized data layer behind budget_dashboard.py (no Streamlit imports, safe to call from scripts/load tests)
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BUDGETS = ["Company", "Project A", "Project B"]
+DEFAULT_ITEMS = ["Rentals", "Fuel", "Construction", "Salaries", "Marketing", "Equipment"]
+
+# ---------------- Helpers ----------------
+def _names(defaults, n, fmt):
+    """First `n` names: the defaults, then generated labels for anything beyond them."""
+    names = list(defaults[:n])
+    names += [fmt.format(k) for k in range(len(names) + 1, n + 1)]
+    return names
+
+def _mix(*keys):
+    """Stable 64-bit hash of integer arrays (broadcast together).
+
+    Unlike the builtin hash() on strings this does not depend on PYTHONHASHSEED,
+    so every process produces the same numbers.
+    """
+    shape = np.broadcast_shapes(*(np.shape(k) for k in keys))
+    h = np.full(shape, 0x9E3779B97F4A7C15, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in keys:
+            k = np.asarray(k, dtype=np.uint64)
+            h ^= k + np.uint64(0x9E3779B97F4A7C15) + (h << np.uint64(6)) + (h >> np.uint64(2))
+        # splitmix64 finalizer
+        h ^= h >> np.uint64(30)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(27)
+        h *= np.uint64(0x94D049BB133111EB)
+        h ^= h >> np.uint64(31)
+    return h
+
+# ---------------- Sample Data ----------------
+def generate_sample_data(n_budgets=3, n_versions=10, n_items=6, n_months=24,
+                         start="2024-01-01", seed=0):
+    """Budget × Version × Item × Month fact table built as one cartesian grid.
+
+    Deterministic for a given set of arguments. Budget/Version/Item are returned
+    as categoricals (Version ordered V1..Vn) to keep large grids compact.
+    """
+    budgets = _names(DEFAULT_BUDGETS, n_budgets, "Project {:03d}")
+    versions = [f"V{i}" for i in range(1, n_versions + 1)]
+    items = _names(DEFAULT_ITEMS, n_items, "Item {:02d}")
+    months = pd.date_range(start, periods=n_months, freq="MS")
+
+    b = np.arange(n_budgets)[:, None, None, None]
+    v = np.arange(n_versions)[None, :, None, None]
+    i = np.arange(n_items)[None, None, :, None]
+    m = np.arange(n_months)[None, None, None, :]
+    shape = (n_budgets, n_versions, n_items, n_months)
+
+    base = 8000 + (_mix(seed, b, i) % np.uint64(6000)).astype(np.int64)          # per budget/item
+    v_adj = (v + 1 - 5) * 250                                                     # version shift
+    season = (np.asarray(months.month)[None, None, None, :] % 6) * 150            # seasonality
+    planned = np.maximum(1000, base + v_adj + season)
+    jitter = ((_mix(seed, b, v, i, m) % np.uint64(21)).astype(np.int64) - 10) / 100.0  # -10%..+10%
+    actual = (planned * (1 + jitter)).astype(np.int64)
+
+    def codes(axis_codes):
+        return np.broadcast_to(axis_codes, shape).ravel().astype(np.int32)
+
+    return pd.DataFrame({
+        "Budget": pd.Categorical.from_codes(codes(b), categories=budgets),
+        "Version": pd.Categorical.from_codes(codes(v), categories=versions, ordered=True),
+        "Item": pd.Categorical.from_codes(codes(i), categories=items),
+        "Month": months.take(codes(m)),
+        "Planned": np.broadcast_to(planned, shape).ravel().astype(np.int64),
+        "Actual": actual.ravel(),
+    })
+
+# ---------------- Cube ----------------
+def version_number(label):
+    """'V12' -> 12 (labels without a number sort first)."""
+    digits = "".join(ch for ch in str(label) if ch.isdigit())
+    return int(digits) if digits else 0
+
+def _axes_and_codes(df):
+    """Sorted Budget/Version/Item/Month axes plus each row's code on them."""
+    axes, codes = [], []
+    for col, key in (("Budget", None), ("Version", version_number), ("Item", None), ("Month", None)):
+        cat = pd.Categorical(df[col])
+        axis = pd.Index(sorted(cat.categories, key=key), name=col)
+        if col == "Month":
+            axis = pd.DatetimeIndex(axis, name=col)
+        axes.append(axis)
+        codes.append(axis.get_indexer(cat.categories)[cat.codes])
+    return axes, codes
+
+class CubeSlice:
+    """Items × Months block of Planned/Actual sums (one budget/version or a rollup)."""
+
+    def __init__(self, items, months, planned, actual):
+        self.items = list(items)
+        self.months = pd.DatetimeIndex(months)
+        self.planned = planned
+        self.actual = actual
+
+    @property
+    def empty(self):
+        return self.planned.size == 0
+
+    @property
+    def variance(self):
+        return self.actual - self.planned
+
+    def metric(self, name):
+        """Items × Months array for Planned / Actual / Variance / Variance %."""
+        if name == "Planned":
+            return self.planned
+        if name == "Actual":
+            return self.actual
+        if name == "Variance":
+            return self.variance
+        if name == "Variance %":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(self.planned != 0, self.variance / self.planned * 100, np.nan)
+        raise KeyError(name)
+
+    def item_month(self, metric):
+        """rows = Month, columns = Item (same shape as the old pivot_table)."""
+        return pd.DataFrame(self.metric(metric).T, index=self.months.rename("Month"),
+                            columns=pd.Index(self.items, name="Item"))
+
+    def by_month(self):
+        return pd.DataFrame({"Planned": self.planned.sum(axis=0), "Actual": self.actual.sum(axis=0)},
+                            index=self.months.rename("Month"))
+
+    def by_item(self):
+        return pd.DataFrame({"Item": self.items,
+                             "Planned": self.planned.sum(axis=1),
+                             "Actual": self.actual.sum(axis=1)})
+
+    def stacked(self, metrics):
+        """rows = (Item, Metric) in the given metric order, columns = months."""
+        block = np.stack([self.metric(m) for m in metrics], axis=1)  # items × metrics × months
+        index = pd.MultiIndex.from_product([self.items, metrics], names=["Item", "Metric"])
+        return pd.DataFrame(block.reshape(len(self.items) * len(metrics), len(self.months)),
+                            index=index, columns=self.months)
+
+    def to_long(self, metrics):
+        """Item, Month, Metric, Amount rows sorted by Item, Metric, Month (export layout)."""
+        n_items, n_months = len(self.items), len(self.months)
+        return pd.DataFrame({
+            "Item": np.repeat(np.asarray(self.items, dtype=object), len(metrics) * n_months),
+            "Month": np.tile(self.months.values, n_items * len(metrics)),
+            "Metric": np.tile(np.repeat(np.asarray(metrics, dtype=object), n_months), n_items),
+            "Amount": np.stack([self.metric(m) for m in metrics], axis=1).ravel(),
+        })
+
+class BudgetCube:
+    """Dense Planned/Actual sums over (Budget, Version, Item, Month), indexed by categorical codes.
+
+    Build it once per dataset version; slices and totals are then array indexing. The
+    sidebar filters never scan fact rows: budget/version are axis lookups, the From/To
+    range is a searchsorted window on the sorted month axis and items are code lookups
+    into that window.
+    """
+
+    def __init__(self, df):
+        # stable axis order: budgets/items alphabetical, versions by number, months ascending
+        (self.budgets, self.versions, self.items, self.months), (b, v, i, m) = _axes_and_codes(df)
+
+        self.shape = (len(self.budgets), len(self.versions), len(self.items), len(self.months))
+        flat = np.ravel_multi_index((b, v, i, m), self.shape)
+        size = int(np.prod(self.shape))
+        self.planned = np.bincount(flat, weights=df["Planned"].to_numpy(dtype=float), minlength=size).reshape(self.shape)
+        self.actual = np.bincount(flat, weights=df["Actual"].to_numpy(dtype=float), minlength=size).reshape(self.shape)
+
+        self.has_cell = np.bincount(flat, minlength=size).reshape(self.shape) > 0  # budget × version × item × month
+        self.has_item = self.has_cell.any(axis=3)     # budget × version × item
+        self.has_month = self.has_cell.any(axis=2)    # budget × version × month
+
+    # ----- axis lookups -----
+    def _b(self, budget):
+        return self.budgets.get_loc(budget)
+
+    def _v(self, version):
+        return self.versions.get_loc(version)
+
+    def versions_for(self, budget):
+        """Versions that have rows for `budget`, newest first."""
+        present = self.has_month[self._b(budget)].any(axis=1)
+        return list(self.versions[present][::-1])
+
+    def month_bounds(self, budget, version):
+        present = self.months[self.has_month[self._b(budget), self._v(version)]]
+        return present.min(), present.max()
+
+    def items_for(self, budget, version):
+        return list(self.items[self.has_item[self._b(budget), self._v(version)]])
+
+    def month_window(self, month_from=None, month_to=None):
+        """Positional [start, stop) of the month axis for an inclusive date range."""
+        start = 0 if month_from is None else self.months.searchsorted(pd.Timestamp(month_from), side="left")
+        stop = len(self.months) if month_to is None else self.months.searchsorted(pd.Timestamp(month_to), side="right")
+        return start, max(start, stop)
+
+    def item_codes(self, items=None):
+        if items is None:
+            return np.arange(len(self.items))
+        codes = self.items.get_indexer(list(items))
+        return np.sort(codes[codes >= 0])
+
+    # ----- slices -----
+    def slice(self, budget, version, month_from=None, month_to=None, items=None):
+        start, stop = self.month_window(month_from, month_to)
+        codes = self.item_codes(items)
+        b, v = self._b(budget), self._v(version)
+        return CubeSlice(self.items[codes], self.months[start:stop],
+                         self.planned[b, v][codes, start:stop],
+                         self.actual[b, v][codes, start:stop])
+
+    def latest_versions(self, budgets):
+        """{budget: newest version that has rows} for many budgets at once."""
+        b = self.budgets.get_indexer(list(budgets))
+        present = self.has_month[b].any(axis=2)                       # budgets × versions
+        last = present.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+        return dict(zip(self.budgets[b], self.versions[last]))
+
+    def coverage(self, pins):
+        """(first month, last month, items) with rows across budget -> version pins."""
+        b = self.budgets.get_indexer(list(pins))
+        v = self.versions.get_indexer(list(pins.values()))
+        months = self.months[self.has_month[b, v].any(axis=0)]
+        return months.min(), months.max(), list(self.items[self.has_item[b, v].any(axis=0)])
+
+    def has_rows(self, pins, month_from=None, month_to=None, items=None):
+        """True when any budget -> version pin has a row for one of `items` inside the month range."""
+        b = self.budgets.get_indexer(list(pins))
+        v = self.versions.get_indexer(list(pins.values()))
+        start, stop = self.month_window(month_from, month_to)
+        codes = self.item_codes(items)
+        return bool(self.has_cell[b, v][:, codes, start:stop].any())
+
+    # ----- consolidation -----
+    def rollup(self, pins, month_from=None, month_to=None, items=None):
+        """Sum many budgets, each pinned to its own version, into one CubeSlice.
+
+        A single gather + reduction over the budget axis (no per-budget loop).
+        """
+        b = self.budgets.get_indexer(list(pins))[:, None, None]
+        v = self.versions.get_indexer(list(pins.values()))[:, None, None]
+        start, stop = self.month_window(month_from, month_to)
+        codes = self.item_codes(items)[None, :, None]
+        m = np.arange(start, stop)[None, None, :]
+        return CubeSlice(self.items[codes.ravel()], self.months[start:stop],
+                         self.planned[b, v, codes, m].sum(axis=0),
+                         self.actual[b, v, codes, m].sum(axis=0))
+
+    # ----- version comparison -----
+    def _version_block(self, metric, budget, versions, month_from, month_to, items):
+        """versions × items × months array for one budget, aligned on the cube axes."""
+        start, stop = self.month_window(month_from, month_to)
+        codes = self.item_codes(items)
+        values = self.planned if metric == "Planned" else self.actual
+        v = self.versions.get_indexer(list(versions))
+        return values[self._b(budget)][v][:, codes, start:stop], self.items[codes], self.months[start:stop]
+
+    def compare_versions(self, budget, base, target, month_from=None, month_to=None, items=None, metric="Planned"):
+        """Item × Month deltas target − base in one aligned array operation (long frame)."""
+        block, item_axis, month_axis = self._version_block(metric, budget, [base, target], month_from, month_to, items)
+        n_items, n_months = block.shape[1:]
+        return pd.DataFrame({
+            "Item": np.repeat(np.asarray(item_axis, dtype=object), n_months),
+            "Month": np.tile(month_axis.values, n_items),
+            "Base": block[0].ravel(),
+            "Target": block[1].ravel(),
+            "Delta": (block[1] - block[0]).ravel(),
+        })
+
+    def version_steps(self, budget, month_from=None, month_to=None, items=None, metric="Planned"):
+        """Per-item totals deltas between every pair of consecutive versions of a budget.
+
+        Returns (versions oldest first, DataFrame[From, To, Item, Delta]).
+        """
+        versions = self.versions_for(budget)[::-1]
+        block, item_axis, _ = self._version_block(metric, budget, versions, month_from, month_to, items)
+        steps = np.diff(block.sum(axis=2), axis=0)  # (versions - 1) × items
+        n_steps, n_items = steps.shape
+        return versions, pd.DataFrame({
+            "From": np.repeat(np.asarray(versions[:-1], dtype=object), n_items),
+            "To": np.repeat(np.asarray(versions[1:], dtype=object), n_items),
+            "Item": np.tile(np.asarray(item_axis, dtype=object), n_steps),
+            "Delta": steps.ravel(),
+        })
+
+# ---------------- Trend metrics ----------------
+TREND_STATS = ["T12M", "YTD", "MoM", "MoM %", "Run-rate"]
+
+def rolling_metrics(sel, window=12, total_label="Total"):
+    """Trailing-window sum, YTD, month-over-month change and run-rate per Item × Month.
+
+    Computed with cumulative sums over the slice's month axis (pass the full history so
+    early months of a selected range still see their trailing window). Returns a frame
+    indexed by Month with columns (Stat, Measure, Item); a `total_label` item holds the
+    all-items series. Run-rate annualizes YTD: YTD / months so far in the year × 12.
+    """
+    measures = ["Planned", "Actual", "Variance"]
+    values = np.stack([sel.metric(m) for m in measures])                     # measures × items × months
+    values = np.concatenate([values.sum(axis=1, keepdims=True), values], axis=1)
+    n_months = values.shape[-1]
+
+    pos = np.arange(n_months)
+    years = np.asarray(sel.months.year)
+    year_start = np.searchsorted(years, years, side="left")                  # first position of each year
+    csum = np.concatenate([np.zeros(values.shape[:-1] + (1,)), values.cumsum(axis=-1)], axis=-1)
+
+    t12 = csum[..., pos + 1] - csum[..., np.maximum(pos + 1 - window, 0)]
+    ytd = csum[..., pos + 1] - csum[..., year_start]
+    prev = np.concatenate([np.full(values.shape[:-1] + (1,), np.nan), values[..., :-1]], axis=-1)
+    mom = values - prev
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mom_pct = np.where(prev != 0, mom / np.abs(prev) * 100, np.nan)
+    run_rate = ytd / (pos - year_start + 1) * 12
+
+    block = np.stack([t12, ytd, mom, mom_pct, run_rate])                    # stats × measures × items × months
+    columns = pd.MultiIndex.from_product([TREND_STATS, measures, [total_label, *sel.items]],
+                                         names=["Stat", "Measure", "Item"])
+    return pd.DataFrame(block.reshape(-1, n_months).T, index=sel.months.rename("Month"), columns=columns)
+
+def waterfall_frame(start_label, start_value, steps, end_label):
+    """Bars for a waterfall chart: opening total, one floating bar per step, closing total.
+
+    `steps` is a Series of deltas indexed by step label.
+    """
+    deltas = steps.to_numpy(dtype=float)
+    ends = start_value + np.cumsum(deltas)
+    starts = ends - deltas
+    end_value = ends[-1] if len(ends) else start_value
+    return pd.DataFrame({
+        "Step": [start_label, *map(str, steps.index), end_label],
+        "Start": np.r_[0.0, starts, 0.0],
+        "End": np.r_[start_value, ends, end_value],
+        "Delta": np.r_[start_value, deltas, end_value],
+        "Kind": ["Total", *np.where(deltas >= 0, "Increase", "Decrease"), "Total"],
+    })
@@ -0,0 +1,371 @@
+# budget_grid.py
+# Create Budget grid helpers (wide editor grid <-> long export layout), no Streamlit imports
+
+import numpy as np
+import pandas as pd
+
+def parse_multi(cell):
+    """Turn cell (str/list/None) into list[str] using , or ; separators."""
+    if isinstance(cell, list):
+        return [str(x).strip() for x in cell if str(x).strip()]
+    if pd.isna(cell) or cell is None:
+        return []
+    s = str(cell).strip()
+    if not s:
+        return []
+    parts = [p.strip() for p in s.replace(";", ",").split(",")]
+    return [p for p in parts if p]
+
+def dimension_labels(series, multi):
+    """Per-row export label: ';'-joined values for multi dims, stripped text otherwise."""
+    if multi:
+        return series.map(lambda v: ";".join(parse_multi(v)))
+    return series.map(lambda v: "" if pd.isna(v) else str(v))
+
+def to_long_format(grid_df, months_cols, meta, extra_cols, multi_cols):
+    """Wide grid (Item, dims, YYYY-MM columns) -> one row per (Item, Month).
+
+    The month block is converted column-wise and melted in one go; dimension labels
+    are computed once per grid row and repeated, not once per (row, month).
+    """
+    n_rows = len(grid_df)
+    planned = grid_df.reindex(columns=months_cols).apply(pd.to_numeric, errors="coerce").fillna(0.0).astype(float)
+    planned.insert(0, "_row", np.arange(n_rows))
+    long = planned.melt(id_vars="_row", var_name="Month", value_name="Planned")
+    rows = long["_row"].to_numpy()
+
+    month_ts = pd.to_datetime(pd.Index(months_cols, dtype=object) + "-01")
+    items = (grid_df["Item"] if "Item" in grid_df else pd.Series("", index=grid_df.index)).astype(str).str.strip()
+
+    out = pd.DataFrame({
+        "Budget": meta["budget_name"],
+        "Version": meta["version"],
+        "BudgetType": meta["budget_type"],
+        "Project": meta.get("project_name") if meta["budget_type"] == "Project" else "",
+        "Currency": meta["currency"],
+        "Month": month_ts[pd.Index(months_cols).get_indexer(long["Month"])],
+        "Item": items.to_numpy(dtype=object)[rows],
+        "Planned": long["Planned"].to_numpy(),
+    }, index=pd.RangeIndex(len(long)))
+    for c in extra_cols:
+        col = grid_df[c] if c in grid_df else pd.Series("", index=grid_df.index)
+        out[c] = dimension_labels(col, c in multi_cols).to_numpy(dtype=object)[rows]
+    return out.sort_values(["Item", "Month"], kind="stable").reset_index(drop=True)
+
+# ---------------- Grid model ----------------
+class BudgetGrid:
+    """Create Budget grid: dimension metadata (Item + dims) and a numeric month block.
+
+    Month amounts live in one (rows × months) float array instead of one object
+    column per month. The editor only ever gets a window of months (`frame(window)`)
+    and edits are written back with `apply(edited, window)`; the model itself stays
+    in session state and is updated in place.
+    """
+
+    DTYPE = np.float64  # float32 would round amounts above ~100k (7 significant digits)
+
+    def __init__(self, meta, month_labels, values=None):
+        self.meta = meta.reset_index(drop=True)
+        self.month_labels = list(month_labels)
+        if values is None:
+            values = np.zeros((len(self.meta), len(self.month_labels)), dtype=self.DTYPE)
+        self.values = np.require(values, dtype=self.DTYPE, requirements=["C", "W"])  # apply() writes into it
+
+    @classmethod
+    def empty(cls, items, month_labels, extra_cols, multi_cols):
+        meta = pd.DataFrame({"Item": pd.Series(list(items), dtype=object)})
+        for c in extra_cols:
+            meta[c] = [[] for _ in range(len(meta))] if c in multi_cols else ""
+        return cls(meta, month_labels)
+
+    @classmethod
+    def from_frame(cls, df, month_labels, extra_cols):
+        """Wide frame (Item, dims, YYYY-MM columns) -> model; missing months are 0."""
+        block = df.reindex(columns=list(month_labels)).apply(pd.to_numeric, errors="coerce").fillna(0.0)
+        return cls(df[["Item"] + list(extra_cols)].copy(), month_labels, block.to_numpy(dtype=cls.DTYPE))
+
+    @classmethod
+    def from_long(cls, long_df, month_labels, extra_cols, multi_cols):
+        """Long rows (Item, dims, Month, Planned) -> model, pivoted in one pass.
+
+        One grid row per distinct (Item, dims) in order of first appearance; months
+        outside `month_labels` are dropped, repeated (row, month) pairs are summed.
+        """
+        keys = ["Item"] + list(extra_cols)
+        labels = long_df.reindex(columns=keys).astype(object).where(lambda d: d.notna(), "").astype(str)
+        row = labels.groupby(keys, sort=False).ngroup().to_numpy()
+        ts = pd.DatetimeIndex(pd.to_datetime(long_df["Month"]))
+        label_keys = pd.Index([int(m[:4]) * 12 + int(m[5:7]) for m in month_labels])
+        col = label_keys.get_indexer(ts.year * 12 + ts.month)
+        keep = col >= 0
+        n_rows = int(row.max()) + 1 if len(row) else 0
+        flat = row[keep] * len(month_labels) + col[keep]
+        planned = pd.to_numeric(long_df["Planned"], errors="coerce").fillna(0.0).to_numpy(dtype=float)[keep]
+        values = np.bincount(flat, weights=planned, minlength=n_rows * len(month_labels))
+        meta = labels[~pd.Series(row).duplicated().to_numpy()].reset_index(drop=True)
+        for c in extra_cols:
+            if c in multi_cols:
+                meta[c] = meta[c].map(parse_multi)
+        return cls(meta, month_labels, values.reshape(n_rows, len(month_labels)))
+
+    def __len__(self):
+        return len(self.meta)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def months_frame(self, window=slice(None)):
+        """Month block as a numeric DataFrame (a view, no per-column copies)."""
+        return pd.DataFrame(self.values[:, window], columns=self.month_labels[window], copy=False)
+
+    def frame(self, window=slice(None)):
+        """Editor/export layout: Item, dims, then the window's month columns."""
+        return pd.concat([self.meta, self.months_frame(window)], axis=1)
+
+    def apply(self, edited, window=slice(None)):
+        """Write an edited window back.
+
+        Metadata is taken from `edited` as a whole; month values only for the window's
+        months. When the rows are unchanged the window is written into `values` in
+        place (metadata only replaced if it differs); rows deleted in the editor are
+        dropped across all months and added rows start at 0 outside the window, which
+        needs a new block.
+        """
+        months = self.month_labels[window]
+        block = (edited.reindex(columns=months).apply(pd.to_numeric, errors="coerce")
+                 .fillna(0.0).to_numpy(dtype=self.DTYPE))
+        meta = edited[list(self.meta.columns)].reset_index(drop=True)
+        if edited.index.equals(pd.RangeIndex(len(self.meta))):
+            self.values[:, window] = block
+            if not meta.equals(self.meta):
+                self.meta = meta
+            return
+        pos = pd.RangeIndex(len(self.meta)).get_indexer(edited.index)
+        values = np.zeros((len(edited), len(self.month_labels)), dtype=self.DTYPE)
+        kept = pos >= 0
+        values[kept] = self.values[pos[kept]]
+        values[:, window] = block
+        self.meta = meta
+        self.values = values
+
+# ---------------- Spreading ----------------
+SPREAD_PROFILES = ["Flat", "Seasonal", "Front-loaded", "Copy actuals"]
+SPREAD_PERIODS = ["Whole range", "Per year"]
+
+def spread_periods(month_labels, period="Whole range"):
+    """(period labels, period code per month) for 'YYYY-MM' labels."""
+    if period == "Per year":
+        years = pd.Index([m[:4] for m in month_labels])
+        labels = list(dict.fromkeys(years))
+        return labels, pd.Index(labels).get_indexer(years)
+    return ["Total"], np.zeros(len(month_labels), dtype=np.int64)
+
+def _period_onehot(period_codes, n_periods):
+    codes = np.asarray(period_codes, dtype=np.int64)
+    onehot = np.zeros((len(codes), n_periods))
+    onehot[np.arange(len(codes)), codes] = 1.0  # months × periods
+    return onehot
+
+def period_totals(values, period_codes, n_periods):
+    """(rows × months) -> (rows × periods) sums."""
+    return np.asarray(values, dtype=float) @ _period_onehot(period_codes, n_periods)
+
+def profile_weights(profile, month_labels, seasonal=None, decay=0.85, reference=None, period_codes=None):
+    """Unnormalized month weights: (1, months), or (rows, months) for 'Copy actuals'.
+
+    Seasonal takes 12 calendar-month weights; Front-loaded decays geometrically from
+    the start of each period; Copy actuals uses `reference` (rows × 12 calendar-month
+    amounts, e.g. another version's actuals).
+    """
+    n = len(month_labels)
+    cal = np.array([int(m[5:7]) - 1 for m in month_labels], dtype=np.int64)
+    if profile == "Flat":
+        return np.ones((1, n))
+    if profile == "Seasonal":
+        w = np.ones(12) if seasonal is None else np.clip(np.asarray(seasonal, dtype=float), 0, None)
+        return w[cal][None, :]
+    if profile == "Front-loaded":
+        codes = np.zeros(n, dtype=np.int64) if period_codes is None else np.asarray(period_codes)
+        starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+        step = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+        return (decay ** step)[None, :]
+    if profile == "Copy actuals":
+        return np.clip(np.asarray(reference, dtype=float), 0, None)[:, cal]
+    raise ValueError(f"Unknown spread profile: {profile}")
+
+def spread_totals(totals, weights, period_codes):
+    """Distribute period totals over months: (rows × periods) -> (rows × months).
+
+    One matrix operation for all rows: each month gets its period's total times its
+    share of the period's weight. Rows whose weights are all zero within a period
+    (e.g. no reference actuals) fall back to a flat split. Non-finite totals or weights
+    (cleared editor cells) count as 0, so the result is always finite.
+    """
+    totals = np.atleast_2d(np.asarray(totals, dtype=float))
+    totals = np.where(np.isfinite(totals), totals, 0.0)
+    codes = np.asarray(period_codes, dtype=np.int64)
+    weights = np.asarray(weights, dtype=float)
+    weights = np.broadcast_to(np.where(np.isfinite(weights), weights, 0.0), (totals.shape[0], len(codes)))
+
+    onehot = _period_onehot(codes, totals.shape[1])
+    period_sum = weights @ onehot  # rows × periods
+    weights = np.where((period_sum == 0)[:, codes], 1.0, weights)
+    period_sum = weights @ onehot
+    return totals[:, codes] * weights / period_sum[:, codes]
+
+def calendar_profile(item_month, items):
+    """Rows × 12 calendar-month amounts per grid item from an Item × Month frame.
+
+    `item_month` has months as rows and items as columns (CubeSlice.item_month);
+    items missing from it get zeros (flat split in spread_totals).
+    """
+    by_cal = item_month.groupby(item_month.index.month).mean().reindex(range(1, 13), fill_value=0.0)
+    block = by_cal.T.reindex(pd.Index(items, dtype=object).astype(str).str.strip()).fillna(0.0)
+    return block.to_numpy(dtype=float)
+
+# ---------------- Editor deltas ----------------
+def editor_changes(prev_state, cur_state):
+    """Cells changed between two st.data_editor states -> (set of (row, column), structural).
+
+    `structural` is True when rows were added/deleted (positions shift) or there is
+    no previous state to diff against; callers should then recompute from scratch.
+    """
+    if not prev_state or not cur_state:
+        return set(), True
+    if (prev_state.get("added_rows") != cur_state.get("added_rows")
+            or prev_state.get("deleted_rows") != cur_state.get("deleted_rows")):
+        return set(), True
+    prev_rows, cur_rows = prev_state.get("edited_rows", {}), cur_state.get("edited_rows", {})
+    changed = set()
+    for row in set(prev_rows) | set(cur_rows):
+        before, after = prev_rows.get(row, {}), cur_rows.get(row, {})
+        changed.update((int(row), col) for col in set(before) | set(after) if before.get(col) != after.get(col))
+    return changed, False
+
+# ---------------- Duplicate validation ----------------
+def explode_dimensions(df, extra_cols, multi_cols, rows=None):
+    """Links table (Dim, Row, Value): one row per dimension value used by a grid row.
+
+    Multi dims are expected as lists (normalize_dimension_columns output); strings are
+    parsed as a fallback. `rows` limits the work to those 0-based row positions.
+    """
+    frames = []
+    positions = np.arange(len(df)) if rows is None else np.asarray(sorted(rows), dtype=np.int64)
+    for c in extra_cols:
+        if c not in df:
+            continue
+        col = df[c].iloc[positions]
+        if c in multi_cols:
+            col = col.map(lambda v: v if isinstance(v, list) else parse_multi(v))
+            counts = col.map(len).to_numpy()
+            values = col.explode()
+            row_ids = np.repeat(positions, np.maximum(counts, 1))
+        else:
+            values = col
+            row_ids = positions
+        values = pd.Series(values.to_numpy(dtype=object)).where(lambda s: s.notna(), "").astype(str).str.strip()
+        frames.append(pd.DataFrame({"Dim": c, "Row": row_ids, "Value": values.to_numpy(dtype=object)}))
+    if not frames:
+        return pd.DataFrame({"Dim": pd.Series(dtype=object), "Row": pd.Series(dtype=np.int64),
+                             "Value": pd.Series(dtype=object)})
+    links = pd.concat(frames, ignore_index=True)
+    return links[links["Value"] != ""].drop_duplicates(["Dim", "Row", "Value"])
+
+def duplicate_issues(links, extra_cols):
+    """{dim: [(value, [1-based rows])]} for values linked from more than one row."""
+    issues = {}
+    if links.empty:
+        return issues
+    n_rows = links.groupby(["Dim", "Value"], sort=False)["Row"].transform("size")
+    dups = links[n_rows > 1]
+    if dups.empty:
+        return issues
+    dim_order = {c: k for k, c in enumerate(extra_cols)}
+    dups = dups.assign(_dim=dups["Dim"].map(dim_order)).sort_values(["_dim", "Row"], kind="stable")
+    grouped = dups.groupby(["Dim", "Value"], sort=False)["Row"].agg(lambda r: sorted(int(x) + 1 for x in r))
+    for (dim, value), rows in grouped.items():
+        issues.setdefault(dim, []).append((value, rows))
+    return issues
+
+def find_duplicate_assignments(df, extra_cols, multi_cols):
+    if df is None or df.empty:
+        return {}
+    return duplicate_issues(explode_dimensions(df, extra_cols, multi_cols), extra_cols)
+
+class DuplicateValidator:
+    """Duplicate-assignment check that keeps the exploded links between reruns.
+
+    `validate(df, changed_rows)` re-explodes only the given rows; pass None after an
+    import/reset/structural edit to rebuild everything. Results are cached until the
+    links change.
+    """
+
+    def __init__(self, extra_cols, multi_cols):
+        self.extra_cols = list(extra_cols)
+        self.multi_cols = set(multi_cols)
+        self.links = None
+        self.n_rows = 0
+        self.issues = {}
+
+    def matches(self, extra_cols, multi_cols):
+        return self.extra_cols == list(extra_cols) and self.multi_cols == set(multi_cols)
+
+    def validate(self, df, changed_rows=None):
+        if df is None or df.empty:
+            self.links, self.n_rows, self.issues = None, 0, {}
+            return self.issues
+        if self.links is None or changed_rows is None or len(df) != self.n_rows:
+            self.links = explode_dimensions(df, self.extra_cols, self.multi_cols)
+            self.n_rows = len(df)
+        elif changed_rows:
+            keep = self.links[~self.links["Row"].isin(list(changed_rows))]
+            fresh = explode_dimensions(df, self.extra_cols, self.multi_cols, rows=changed_rows)
+            self.links = pd.concat([keep, fresh], ignore_index=True)
+        else:
+            return self.issues
+        self.issues = duplicate_issues(self.links, self.extra_cols)
+        return self.issues
+
+# ---------------- Totals ----------------
+def _to_float(v):
+    v = pd.to_numeric(v, errors="coerce")
+    return 0.0 if pd.isna(v) else float(v)
+
+class GridTotals:
+    """Row and per-month totals of the grid's month block, patched from edit deltas.
+
+    `update()` adds (new − old) for each changed cell; a full recompute happens only
+    when there is nothing to patch against (first run, import/reset, rows added or
+    removed, month range changed).
+    """
+
+    def __init__(self):
+        self.month_cols = None
+        self.values = None   # rows × months, last seen numeric block
+        self.row = None
+        self.month = None
+
+    def recompute(self, df, month_cols):
+        block = df.reindex(columns=month_cols).apply(pd.to_numeric, errors="coerce").fillna(0.0)
+        self.month_cols = list(month_cols)
+        self.values = block.to_numpy(dtype=float, copy=True)  # patched in place by update()
+        self.row = self.values.sum(axis=1)
+        self.month = self.values.sum(axis=0)
+
+    def update(self, df, month_cols, changed_cells=(), structural=False):
+        if (structural or self.values is None or self.month_cols != list(month_cols)
+                or len(df) != len(self.row)):
+            self.recompute(df, month_cols)
+            return
+        pos = {c: j for j, c in enumerate(self.month_cols)}
+        for row, col in changed_cells:
+            j = pos.get(col)
+            if j is None or row >= len(self.row):
+                continue
+            new = _to_float(df[col].iat[row])
+            delta = new - self.values[row, j]
+            if delta:
+                self.values[row, j] = new
+                self.row[row] += delta
+                self.month[j] += delta
@@ -0,0 +1,293 @@
+# budget_io.py
+# File import/export for budget frames: chunked CSV, compressed variants, Parquet
+
+import gzip
+import io
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from budget_catalogs import Catalog
+
+EXPORT_CHUNK_ROWS = 50_000
+IMPORT_CHUNK_ROWS = 20_000
+MAX_REPORTED = 20  # sample size for row numbers / values listed in import problems
+
+# format -> (file extension, mime type)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "CSV (zip)": (".zip", "application/zip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def available_formats():
+    return [f for f in EXPORT_FORMATS if f != "Parquet" or parquet_available()]
+
+# ---------------- Import ----------------
+def _csv_chunks(fh, wanted, header, chunk_rows):
+    """Template CSV in chunks, template columns only; numeric month columns come back as numbers.
+
+    Month columns are not forced to float64: one stray text cell must not fail the
+    whole read, it is coerced (and reported) like in workbooks.
+
+    Yields (chunk, fraction of the file read or None); the full header row is appended
+    to `header` as it is read.
+    """
+    def keep(col):
+        if col not in header:
+            header.append(col)
+        return str(col).strip() in wanted
+
+    reader = pd.read_csv(fh, chunksize=chunk_rows, usecols=keep, thousands=",",
+                         keep_default_na=False, na_values=[""])
+    size = getattr(fh, "size", None)
+    for chunk in reader:
+        yield chunk, (min(fh.tell() / size, 1.0) if size else None)
+
+def _xlsx_chunks(fh, wanted, header, chunk_rows):
+    """First sheet of a workbook in chunks, streamed with openpyxl's read-only mode."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fh, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        first = next(rows, None)
+        if first is None:
+            return
+        header.extend("" if h is None else str(h) for h in first)
+        keep = [k for k, h in enumerate(header) if h.strip() in wanted]
+        total = (wb.active.max_row or 0) - 1
+        names = [header[k] for k in keep]
+        batch, done = [], 0
+        for row in rows:
+            batch.append([row[k] if k < len(row) else None for k in keep])
+            if len(batch) == chunk_rows:
+                done += len(batch)
+                yield pd.DataFrame.from_records(batch, columns=names), (min(done / total, 1.0) if total > 0 else None)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=names), 1.0
+    finally:
+        wb.close()
+
+def _parse_errors():
+    """Exceptions that mean the upload itself is unreadable (reported, never raised)."""
+    errors = (ValueError, KeyError, zipfile.BadZipFile)
+    try:
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        return errors
+    return errors + (InvalidFileException,)
+
+def _text(series):
+    return series.astype(object).where(series.notna(), "").astype(str).str.strip()
+
+def _split_multi(series):
+    """'E1; E2,E3' cells -> ['E1', 'E2', 'E3'] lists (same rules as budget_grid.parse_multi)."""
+    parts = _text(series).str.replace(";", ",", regex=False).str.split(",")
+    return parts.map(lambda xs: [x.strip() for x in xs if x.strip()])
+
+def read_budget_template(fh, name, month_cols, extra_cols, multi_cols, catalogs=None,
+                         chunk_rows=IMPORT_CHUNK_ROWS, progress=None):
+    """Stream a CSV/XLSX template into the editor grid layout (Item, dims, months).
+
+    The file is read `chunk_rows` at a time; each chunk is trimmed to the template
+    columns, typed (float64 months, list/str dims) and validated before the next one
+    is read. `catalogs` maps dim -> Catalog (or plain value lists); `progress(rows_read, fraction)`
+    is called after every chunk (fraction is None when the total is unknown).
+
+    Returns (grid DataFrame, list of problem messages).
+    """
+    month_cols, extra_cols = list(month_cols), list(extra_cols)
+    columns = ["Item"] + extra_cols + month_cols
+    catalogs = {d: v if isinstance(v, Catalog) else Catalog(d, v)
+                for d, v in (catalogs or {}).items() if d in extra_cols}
+    header = []
+    if name.lower().endswith(".csv"):
+        chunks = _csv_chunks(fh, set(columns), header, chunk_rows)
+    else:
+        chunks = _xlsx_chunks(fh, set(columns), header, chunk_rows)
+
+    frames, problems = [], []
+    blank_items, bad_numbers, unknown = [], 0, {d: set() for d in catalogs}
+    offset = 0
+    try:
+        for chunk, fraction in chunks:
+            chunk.columns = [str(c).strip() for c in chunk.columns]
+            n = len(chunk)
+            out = pd.DataFrame(index=pd.RangeIndex(offset, offset + n))
+
+            items = _text(chunk["Item"]) if "Item" in chunk else pd.Series("", index=chunk.index)
+            out["Item"] = items.to_numpy(dtype=object)
+            if len(blank_items) < MAX_REPORTED:
+                blank_items.extend((offset + np.flatnonzero(items.to_numpy() == "") + 2).tolist())
+
+            for c in extra_cols:
+                col = chunk[c] if c in chunk else pd.Series(np.nan, index=chunk.index)
+                values = _split_multi(col) if c in multi_cols else _text(col)
+                out[c] = values.to_numpy(dtype=object)
+                if c in catalogs:
+                    flat = values.explode() if c in multi_cols else values
+                    flat = flat[flat.notna() & (flat != "")]
+                    unknown[c].update(flat[~catalogs[c].contains(flat.to_numpy())].unique().tolist())
+
+            for m in month_cols:
+                if m not in chunk:
+                    out[m] = 0.0
+                    continue
+                raw = chunk[m]
+                if pd.api.types.is_numeric_dtype(raw) and not pd.api.types.is_bool_dtype(raw):
+                    values = raw.astype("float64")
+                else:  # text cells ('1,200', 'abc') or mixed workbook cells
+                    values = pd.to_numeric(raw.astype(str).str.replace(",", "", regex=False), errors="coerce")
+                bad_numbers += int((values.isna() & raw.notna()).sum())
+                out[m] = values.fillna(0.0).to_numpy(dtype="float64")
+
+            frames.append(out)
+            offset += n
+            if progress is not None:
+                progress(offset, fraction)
+    except _parse_errors() as exc:
+        problems.append(f"Could not parse the file: {exc}")
+        return None, problems
+
+    header = [str(c).strip() for c in header]
+    if not header:
+        problems.append("The file is empty.")
+        return None, problems
+
+    missing = [c for c in columns if c not in header]
+    if missing:
+        problems.append(f"Missing columns filled with defaults: {', '.join(missing)}")
+    ignored = [c for c in header if c not in columns]
+    if ignored:
+        problems.append(f"Ignored columns (not in the template or month range): {', '.join(ignored[:MAX_REPORTED])}")
+    if blank_items:
+        problems.append(f"Rows with an empty Item: {blank_items[:MAX_REPORTED]}")
+    if bad_numbers:
+        problems.append(f"{bad_numbers:,} non-numeric month cells were set to 0")
+    for dim, values in unknown.items():
+        if values:
+            sample = sorted(values)[:MAX_REPORTED]
+            problems.append(f"{dim} values not in the catalog ({len(values):,}): {', '.join(sample)}")
+
+    grid = pd.concat(frames) if frames else pd.DataFrame(columns=columns)
+    return grid[columns].reset_index(drop=True), problems
+
+# ---------------- Budget exports (round trip) ----------------
+# Columns of to_long_format output that are constant per budget and live in `meta`
+_META_COLUMNS = {"Budget": "budget_name", "Version": "version", "BudgetType": "budget_type",
+                 "Project": "project_name", "Currency": "currency"}
+
+def budget_json_bytes(long_df, meta):
+    """Compact column-oriented JSON: {"meta", "layout": "columns", "data": {column: [values]}}.
+
+    Per-budget constants are kept once in `meta` instead of on every row; no indentation.
+    """
+    data = long_df.drop(columns=[c for c in _META_COLUMNS if c in long_df])
+    data = data.assign(Month=pd.to_datetime(data["Month"]).dt.strftime("%Y-%m-%d"))
+    payload = {"meta": meta, "layout": "columns",
+               "data": {c: data[c].tolist() for c in data.columns}}
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+_EXPORT_COLUMNS = ["Month", "Item", "Planned"]
+
+def read_budget_export(data, name):
+    """(long DataFrame, meta) from an exported .json (columnar or legacy records) or .parquet.
+
+    Raises ValueError with a readable message when the file is not a budget export
+    (unreadable JSON/Parquet, unexpected payload shape, missing Month/Item/Planned).
+    Months that do not parse become NaT.
+    """
+    if name.lower().endswith(".parquet"):
+        try:
+            long_df = pd.read_parquet(io.BytesIO(data))
+        except (ValueError, OSError) as exc:
+            raise ValueError(f"Could not read the Parquet file: {exc}") from exc
+        meta = dict(long_df.attrs.get("budget_meta", {}))
+    else:
+        try:
+            payload = json.loads(data)
+        except ValueError as exc:  # includes JSONDecodeError and bad UTF-8
+            raise ValueError(f"Could not read the JSON file: {exc}") from exc
+        if not isinstance(payload, dict):
+            raise ValueError("The JSON file is not a budget export (expected an object with meta and data).")
+        meta = payload.get("meta", {})
+        rows = payload.get("data", [])
+        if not isinstance(meta, dict):
+            meta = {}
+        try:
+            if payload.get("layout") == "columns" and isinstance(rows, dict):
+                long_df = pd.DataFrame(rows)
+            elif isinstance(rows, list):  # records export from earlier releases
+                long_df = pd.DataFrame.from_records(rows)
+            else:
+                raise TypeError("data is neither columns nor records")
+        except (ValueError, TypeError) as exc:
+            raise ValueError(f"The JSON file is not a budget export: {exc}") from exc
+    missing = [c for c in _EXPORT_COLUMNS if c not in long_df]
+    if missing:
+        raise ValueError(f"Not a budget export; missing columns: {', '.join(missing)}")
+    for col, key in _META_COLUMNS.items():
+        if col not in long_df:
+            long_df[col] = meta.get(key, "")
+    long_df["Month"] = pd.to_datetime(long_df["Month"], errors="coerce")
+    return long_df, meta
+
+# ---------------- Export ----------------
+def iter_csv_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """UTF-8 CSV bytes, header first, `chunk_rows` rows at a time."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+def write_export(df, fmt, fh, name="data.csv", chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write `df` to the binary file object `fh` in the given EXPORT_FORMATS format."""
+    if fmt == "CSV":
+        for chunk in iter_csv_chunks(df, chunk_rows):
+            fh.write(chunk)
+    elif fmt == "CSV (gzip)":
+        with gzip.GzipFile(fileobj=fh, mode="wb") as gz:
+            for chunk in iter_csv_chunks(df, chunk_rows):
+                gz.write(chunk)
+    elif fmt == "CSV (zip)":
+        with zipfile.ZipFile(fh, "w", compression=zipfile.ZIP_DEFLATED) as zf, zf.open(name, "w") as member:
+            for chunk in iter_csv_chunks(df, chunk_rows):
+                member.write(chunk)
+    elif fmt == "Parquet":
+        df.to_parquet(fh, index=False, row_group_size=chunk_rows)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+def export_bytes(df, fmt, file_stem="data", chunk_rows=EXPORT_CHUNK_ROWS):
+    buf = io.BytesIO()
+    write_export(df, fmt, buf, name=f"{file_stem}.csv", chunk_rows=chunk_rows)
+    return buf.getvalue()
+
+def download_widget(label, build, file_stem, key, formats=None, encode=export_bytes, container=None):
+    """Format picker + 'Prepare' button; the file is only built when asked for.
+
+    `build()` returns the frame to export and `encode(frame, fmt, file_stem)` the bytes.
+    Nothing is encoded or kept in memory on ordinary reruns.
+    """
+    import streamlit as st
+
+    box = container or st
+    formats = formats or {f: EXPORT_FORMATS[f] for f in available_formats()}
+    c_fmt, c_btn = box.columns([3, 1])
+    fmt = c_fmt.selectbox(label, list(formats), key=f"{key}_fmt")
+    if c_btn.button("Prepare file", key=f"{key}_prepare"):
+        ext, mime = formats[fmt]
+        with st.spinner("Building file..."):
+            data = encode(build(), fmt, file_stem)
+        box.download_button(f"⬇️ Download {file_stem}{ext} ({len(data) / 1e6:,.1f} MB)", data,
+                            file_name=f"{file_stem}{ext}", mime=mime, key=f"{key}_download")
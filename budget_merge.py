@@ -0,0 +1,100 @@
+# budget_merge.py
+# Bulk merge of departmental template uploads, parsed in a process pool
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import PurePath
+
+import numpy as np
+import pandas as pd
+
+from budget_grid import find_duplicate_assignments, to_long_format
+from budget_io import read_budget_template
+
+_CATALOGS = None  # set once per worker process by _init_worker
+
+def _init_worker(catalogs):
+    global _CATALOGS
+    _CATALOGS = catalogs
+
+def parse_department(name, data, month_labels, extra_cols, multi_cols):
+    """Worker: one uploaded file -> (name, wide grid or None, problems, duplicate issues).
+
+    Runs in a child process; the catalogs come from the pool initializer so they are
+    shipped once per worker, not once per file. Any error reading the file rejects
+    that file only, it never reaches the other files of the merge.
+    """
+    fh = io.BytesIO(data)
+    fh.size = len(data)
+    try:
+        grid, problems = read_budget_template(fh, name, month_labels, extra_cols, multi_cols, catalogs=_CATALOGS)
+    except Exception as exc:  # one unreadable upload must not stop the merge
+        return name, None, [f"Could not parse the file: {exc}"], {}
+    if grid is None:
+        return name, None, problems, {}
+    if len(grid) and (grid["Item"] == "").all():
+        return name, None, problems + ["No Item values; file does not match the template"], {}
+    return name, grid, problems, find_duplicate_assignments(grid, extra_cols, multi_cols)
+
+def department_name(file_name):
+    return PurePath(file_name).stem
+
+def merge_uploads(files, month_labels, extra_cols, multi_cols, meta, catalogs=None, max_workers=None,
+                  progress=None):
+    """Parse many template files concurrently and concatenate the valid ones.
+
+    `files` is a list of (file name, bytes). Files with parse errors or duplicate
+    dimension assignments are left out. Returns (long DataFrame with a Department
+    column, per-file report DataFrame, cross-department duplicate issues). Cross-department
+    duplicates are only reported; the caller must not use the merge while there are any.
+    """
+    workers = max(1, min(len(files), max_workers or os.cpu_count() or 1))
+    args = (list(month_labels), list(extra_cols), set(multi_cols))
+    results = {}
+    if workers == 1:
+        _init_worker(catalogs)
+        for k, (name, data) in enumerate(files):
+            results[k] = parse_department(name, data, *args)
+            if progress is not None:
+                progress(len(results), len(files))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(catalogs,)) as pool:
+            futures = {pool.submit(parse_department, name, data, *args): k for k, (name, data) in enumerate(files)}
+            for fut in as_completed(futures):
+                results[futures[fut]] = fut.result()
+                if progress is not None:
+                    progress(len(results), len(files))
+
+    report, longs, grids, depts = [], [], [], []
+    for k in range(len(files)):
+        name, grid, problems, issues = results[k]
+        dept = department_name(name)
+        n_dups = sum(len(v) for v in issues.values())
+        ok = grid is not None and not n_dups
+        report.append({"File": name, "Department": dept, "Rows": 0 if grid is None else len(grid),
+                       "Status": "merged" if ok else "rejected",
+                       "Notes": "; ".join(problems + ([f"{n_dups} duplicate dimension assignments"] if n_dups else []))})
+        if ok:
+            longs.append(to_long_format(grid, month_labels, meta, extra_cols, multi_cols).assign(Department=dept))
+            grids.append(grid)
+            depts.append(dept)
+
+    merged = pd.concat(longs, ignore_index=True) if longs else pd.DataFrame()
+    return merged, pd.DataFrame(report), cross_department_issues(grids, depts, extra_cols, multi_cols)
+
+def cross_department_issues(grids, departments, extra_cols, multi_cols):
+    """Duplicate assignments across merged files: {dim: [(value, ['dept row n', ...])]}."""
+    if not grids:
+        return {}
+    sizes = np.array([len(g) for g in grids])
+    owner = np.repeat(np.arange(len(grids)), sizes)
+    start = np.r_[0, np.cumsum(sizes)[:-1]]
+    issues = find_duplicate_assignments(pd.concat(grids, ignore_index=True), extra_cols, multi_cols)
+    out = {}
+    for dim, values in issues.items():
+        for value, rows in values:
+            where = [(owner[r - 1], r - start[owner[r - 1]]) for r in rows]
+            if len({d for d, _ in where}) > 1:  # duplicates inside one file already rejected it
+                out.setdefault(dim, []).append((value, [f"{departments[d]} row {n}" for d, n in where]))
+    return out
@@ -0,0 +1,258 @@
+# budget_store.py
+# Local SQLite store for saved budget versions (single file, no server)
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from budget_engine import generate_sample_data, version_number
+
+DEFAULT_DB = os.environ.get("BUDGET_DB", str(Path(__file__).with_name("budgets.db")))
+
+FACT_COLUMNS = ["Budget", "Version", "Item", "Month", "Planned", "Actual"]
+SNAPSHOT_EVERY = 5  # a full snapshot at least every N versions along a parent chain
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    budget      TEXT NOT NULL,
+    version     TEXT NOT NULL,
+    budget_type TEXT,
+    project     TEXT,
+    currency    TEXT,
+    dimensions  TEXT,
+    saved_at    TEXT NOT NULL,
+    n_rows      INTEGER NOT NULL,
+    parent      TEXT,                       -- NULL: stored as a full snapshot
+    depth       INTEGER NOT NULL DEFAULT 0, -- deltas since the last snapshot
+    PRIMARY KEY (budget, version)
+);
+-- clustered on (Budget, Version, Month, Item): a budget/version/month range is one index range scan.
+-- Snapshot versions hold every cell; delta versions only cells that differ from the parent
+-- (deleted = 1 marks a cell the parent has and this version dropped).
+CREATE TABLE IF NOT EXISTS facts (
+    budget  TEXT NOT NULL,
+    version TEXT NOT NULL,
+    month   TEXT NOT NULL,
+    item    TEXT NOT NULL,
+    planned REAL NOT NULL DEFAULT 0,
+    actual  REAL NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (budget, version, month, item)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO store_meta VALUES ('revision', '0');
+"""
+
+# columns added after the first release of the store (existing versions become snapshots)
+_MIGRATIONS = [
+    ("versions", "parent", "ALTER TABLE versions ADD COLUMN parent TEXT"),
+    ("versions", "depth", "ALTER TABLE versions ADD COLUMN depth INTEGER NOT NULL DEFAULT 0"),
+    ("facts", "deleted", "ALTER TABLE facts ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0"),
+]
+
+_CELL = ["Month", "Item"]
+
+def _in(column, values):
+    return f"{column} IN ({', '.join('?' * len(values))})" if len(values) else "0"
+
+def _diff(parent, new):
+    """Delta rows turning `parent` cells into `new` cells (Month, Item, Planned, Actual, Deleted)."""
+    merged = parent.merge(new, on=_CELL, how="outer", suffixes=("_p", ""), indicator=True)
+    gone = merged["_merge"] == "left_only"
+    changed = (merged["_merge"] == "right_only") | (
+        (merged["_merge"] == "both")
+        & ((merged["Planned"] != merged["Planned_p"]) | (merged["Actual"] != merged["Actual_p"])))
+    out = merged.loc[gone | changed, _CELL + ["Planned", "Actual"]].fillna({"Planned": 0.0, "Actual": 0.0})
+    return out.assign(Deleted=gone[gone | changed].astype(int).to_numpy())
+
+class BudgetStore:
+    """Saved budgets: one fact row per (Budget, Version, Month, Item), plus version metadata.
+
+    Connections are opened per call, so one store object can be shared across
+    Streamlit sessions/threads. Every save bumps `data_version()`, which callers use
+    as their cache key.
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = str(path)
+        with closing(self._connect()) as con, con:
+            con.executescript(_SCHEMA)
+            for table, column, ddl in _MIGRATIONS:
+                if column not in {row[1] for row in con.execute(f"PRAGMA table_info({table})")}:
+                    con.execute(ddl)
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    # ----- metadata -----
+    def data_version(self):
+        with closing(self._connect()) as con:
+            (rev,) = con.execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()
+        return f"store-{rev}"
+
+    def is_empty(self):
+        with closing(self._connect()) as con:
+            return con.execute("SELECT 1 FROM versions LIMIT 1").fetchone() is None
+
+    def has_version(self, budget, version):
+        with closing(self._connect()) as con:
+            return con.execute("SELECT 1 FROM versions WHERE budget = ? AND version = ?",
+                               (budget, version)).fetchone() is not None
+
+    def list_versions(self):
+        with closing(self._connect()) as con:
+            return pd.read_sql_query("SELECT budget AS Budget, version AS Version, budget_type AS BudgetType, "
+                                     "currency AS Currency, saved_at AS SavedAt, parent AS Parent, "
+                                     "n_rows AS StoredRows FROM versions ORDER BY budget, version", con)
+
+    # ----- writes -----
+    def save_version(self, df, meta=None):
+        """Replace the given budget/version(s) with the rows of a long frame.
+
+        `df` needs Budget, Version, Month, Item, Planned (Actual optional); rows are
+        summed per (Budget, Version, Month, Item). Each version is stored as a delta
+        against the budget's closest lower version, or as a full snapshot when it has
+        none or its chain reached SNAPSHOT_EVERY deltas. Everything is written in one
+        transaction; returns the number of fact rows stored.
+        """
+        meta = meta or {}
+        df = df.assign(Actual=df["Actual"] if "Actual" in df else 0.0)
+        facts = (df.assign(Budget=df["Budget"].astype(str), Version=df["Version"].astype(str),
+                           Item=df["Item"].astype(str), Month=pd.to_datetime(df["Month"]).dt.strftime("%Y-%m-%d"))
+                 .groupby(["Budget", "Version", "Month", "Item"], observed=True, sort=False)[["Planned", "Actual"]]
+                 .sum().astype(float).reset_index())
+        saved_at = datetime.now().isoformat(timespec="seconds")
+        keys = sorted(facts[["Budget", "Version"]].drop_duplicates().itertuples(index=False),
+                      key=lambda bv: (bv[0], version_number(bv[1]), bv[1]))
+        groups = facts.groupby(["Budget", "Version"], sort=False)
+
+        stored = 0
+        with closing(self._connect()) as con, con:
+            for budget, version in keys:
+                cells = groups.get_group((budget, version))[_CELL + ["Planned", "Actual"]]
+                stored += self._write_version(con, budget, version, cells, meta, saved_at)
+            con.execute("UPDATE store_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'revision'")
+        return stored
+
+    def _write_version(self, con, budget, version, cells, meta, saved_at):
+        versions = pd.read_sql_query("SELECT version, parent, depth FROM versions WHERE budget = ?", con, params=[budget])
+
+        # versions built on top of the one being replaced are re-stored as snapshots first
+        for child in versions.loc[versions["parent"] == version, "version"]:
+            self._store_cells(con, budget, child, self._materialize(con, {budget: child}).assign(Deleted=0))
+            con.execute("UPDATE versions SET parent = NULL, depth = 0, n_rows = "
+                        "(SELECT COUNT(*) FROM facts WHERE budget = ? AND version = ?) "
+                        "WHERE budget = ? AND version = ?", (budget, child, budget, child))
+
+        others = versions[versions["version"] != version]
+        lower = others[others["version"].map(version_number) < version_number(version)]
+        parent, depth = None, 0
+        if not lower.empty:
+            best = lower.iloc[lower["version"].map(version_number).to_numpy().argmax()]
+            if int(best["depth"]) + 1 < SNAPSHOT_EVERY:
+                parent, depth = best["version"], int(best["depth"]) + 1
+
+        if parent is None:
+            rows = cells.assign(Deleted=0)
+        else:
+            base = self._materialize(con, {budget: parent})
+            rows = _diff(base.assign(Month=base["Month"].dt.strftime("%Y-%m-%d"))[_CELL + ["Planned", "Actual"]], cells)
+        self._store_cells(con, budget, version, rows)
+        con.execute("INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (budget, version, meta.get("budget_type"), meta.get("project_name"), meta.get("currency"),
+                     json.dumps(meta.get("extra_columns", [])), saved_at, len(rows), parent, depth))
+        return len(rows)
+
+    @staticmethod
+    def _store_cells(con, budget, version, rows):
+        con.execute("DELETE FROM facts WHERE budget = ? AND version = ?", (budget, version))
+        months = rows["Month"]
+        if not isinstance(months.iloc[0] if len(months) else "", str):
+            months = months.dt.strftime("%Y-%m-%d")
+        con.executemany("INSERT INTO facts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        zip([budget] * len(rows), [version] * len(rows), months, rows["Item"],
+                            rows["Planned"].astype(float), rows["Actual"].astype(float), rows["Deleted"].astype(int)))
+
+    # ----- reads -----
+    def _chains(self, con):
+        """{(budget, version): [snapshot, ..., version]} from the parent links."""
+        parents = dict(((b, v), p) for b, v, p in con.execute("SELECT budget, version, parent FROM versions"))
+        chains = {}
+        for key in parents:
+            chain, cur = [key[1]], parents[key]
+            while cur is not None:
+                chain.append(cur)
+                cur = parents.get((key[0], cur))
+            chains[key] = chain[::-1]
+        return chains
+
+    def _materialize(self, con, pins=None):
+        """Rebuild versions from their snapshot + deltas.
+
+        All stored rows of every version on the requested chains are fetched in one
+        query, tagged with their position on each target's chain, and the last row per
+        (target, Month, Item) wins; deletion markers are dropped at the end.
+        """
+        chains = self._chains(con)
+        targets = [(b, v) for b, v in chains if pins is None or pins.get(b) == v]
+        plan = pd.DataFrame([(b, v, src, rank) for b, v in targets for rank, src in enumerate(chains[(b, v)])],
+                            columns=["budget", "target", "version", "rank"])
+
+        sql, params = "SELECT budget, version, item, month, planned, actual, deleted FROM facts", []
+        if pins is not None:  # a full load needs every stored row, no clause to bind
+            sources = plan.groupby("budget")["version"].unique() if len(plan) else pd.Series(dtype=object)
+            sql += " WHERE " + (" OR ".join(f"(budget = ? AND {_in('version', list(vs))})" for vs in sources) or "0")
+            for b, vs in sources.items():
+                params += [b, *vs]
+        rows = pd.read_sql_query(sql, con, params=params)
+
+        rows = rows.merge(plan, on=["budget", "version"])
+        rows = (rows.sort_values(["budget", "target", "month", "item", "rank"], kind="stable")
+                .drop_duplicates(["budget", "target", "month", "item"], keep="last"))
+        rows = rows[rows["deleted"] == 0]
+        df = pd.DataFrame({
+            "Budget": rows["budget"].astype("category").to_numpy(),
+            "Version": rows["target"].astype("category").to_numpy(),
+            "Item": rows["item"].astype("category").to_numpy(),
+            "Month": pd.to_datetime(rows["month"]).to_numpy(),
+            "Planned": rows["planned"].to_numpy(dtype=float),
+            "Actual": rows["actual"].to_numpy(dtype=float),
+        }, columns=FACT_COLUMNS)
+        for col in ("Budget", "Version", "Item"):
+            df[col] = df[col].astype("category")
+        return df
+
+    def load(self, pins=None):
+        """Materialized fact rows of every saved version, or only `pins` ({budget: version}).
+
+        Returns the FACT_COLUMNS layout of generate_sample_data. Rows are ordered by the
+        budget, version, month and item label strings ('V10' before 'V2'), not by version
+        number; categories are sorted the same way.
+        """
+        with closing(self._connect()) as con:
+            return self._materialize(con, pins)
+
+    def storage_stats(self):
+        """Stored fact rows vs. materialized cells, per budget."""
+        with closing(self._connect()) as con:
+            return pd.read_sql_query(
+                "SELECT budget AS Budget, COUNT(*) AS Versions, SUM(parent IS NULL) AS Snapshots, "
+                "SUM(n_rows) AS StoredRows FROM versions GROUP BY budget ORDER BY budget", con)
+
+def open_store(path=DEFAULT_DB):
+    """The store at `path`, seeded with generate_sample_data() while it holds no versions."""
+    store = BudgetStore(path)
+    if store.is_empty():
+        store.save_version(generate_sample_data())
+    return store
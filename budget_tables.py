@@ -0,0 +1,100 @@
+# budget_tables.py
+# Display helpers for wide month tables: vectorized number formatting + block styling
+
+import numpy as np
+import pandas as pd
+
+METRIC_COLORS = {
+    "Planned": "#1f77b4",    # blue
+    "Actual": "#2ca02c",     # green
+    "Variance": "#d62728",   # red
+    "Variance %": "#9467bd", # purple
+}
+
+MONTH_WINDOW = 12  # months rendered at once in wide tables
+
+# ---------------- Formatting ----------------
+def format_amounts(values):
+    """Rounded thousands-separated strings ('12,345', '-1,000'); NaN -> '-'.
+
+    Works digit group by digit group over the whole array instead of formatting
+    cell by cell.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return np.zeros(values.shape, dtype="U1")
+    nan = np.isnan(values)
+    rounded = np.rint(np.where(nan, 0, values)).astype(np.int64)
+    mag = np.abs(rounded)
+
+    # index of the most significant 3-digit group per cell
+    top = np.zeros(mag.shape, dtype=np.int64)
+    rest = mag // 1000
+    while rest.any():
+        top += rest > 0
+        rest //= 1000
+
+    out = np.zeros(mag.shape, dtype="U32")
+    for k in range(int(top.max(initial=0)) + 1):
+        group = ((mag // 1000 ** k) % 1000).astype(str)
+        part = np.where(k == top, group, np.char.zfill(group, 3))
+        out = np.where(k > top, out, part if k == 0 else np.char.add(np.char.add(part, ","), out))
+
+    out = np.where(rounded < 0, np.char.add("-", out), out)
+    return np.where(nan, "-", out)
+
+def format_percents(values, decimals=2):
+    """'12.34%' strings; NaN -> '-'."""
+    values = np.asarray(values, dtype=float)
+    nan = np.isnan(values)
+    out = np.char.mod(f"%.{decimals}f%%", np.where(nan, 0, values))
+    return np.where(nan, "-", out)
+
+# ---------------- Month windows ----------------
+def month_windows(months, size=MONTH_WINDOW):
+    """[(label, slice)] covering the month axis in chunks of `size`."""
+    months = pd.DatetimeIndex(months)
+    windows = []
+    for start in range(0, len(months), size):
+        stop = min(start + size, len(months))
+        label = f"{months[start]:%Y-%m} → {months[stop - 1]:%Y-%m}"
+        windows.append((label, slice(start, stop)))
+    return windows
+
+# ---------------- Stacked (Item, Metric) table ----------------
+def stacked_display(table, window=slice(None)):
+    """String table for rows = (Item, Metric), columns = months.
+
+    The item label is kept only on the first metric row of each item (tables don't
+    support row-spans). Returns (display DataFrame, month column labels).
+    """
+    months = pd.DatetimeIndex(table.columns[window])
+    values = table.to_numpy(dtype=float)[:, window]
+    items = table.index.get_level_values("Item").astype(str)
+    metrics = np.asarray(table.index.get_level_values("Metric"))
+
+    is_pct = metrics == "Variance %"
+    cells = np.empty(values.shape, dtype=object)
+    cells[is_pct] = format_percents(values[is_pct])
+    cells[~is_pct] = format_amounts(values[~is_pct])
+
+    month_cols = list(months.strftime("%Y-%m"))
+    first = np.r_[True, items[1:] != items[:-1]]
+    display = pd.DataFrame(cells, columns=month_cols)
+    display.insert(0, "Metric", metrics)
+    display.insert(0, "Item", np.where(first, items, ""))
+    return display, month_cols
+
+def style_stacked(display, month_cols, colors=METRIC_COLORS):
+    """Color month cells by metric and bold the item label, one rule per row block."""
+    styler = display.style
+    metric = display["Metric"].to_numpy()
+    for name, color in colors.items():
+        rows = display.index[metric == name]
+        if len(rows):
+            styler = styler.set_properties(subset=pd.IndexSlice[rows, month_cols],
+                                           **{"color": color, "font-weight": "600"})
+    labelled = display.index[display["Item"].to_numpy() != ""]
+    if len(labelled):
+        styler = styler.set_properties(subset=pd.IndexSlice[labelled, ["Item"]], **{"font-weight": "700"})
+    return styler
@@ -0,0 +1,131 @@
+# cheques.py
+# Cheque lifecycle: append-only status events and a vectorized state engine (pandas/numpy only)
+
+import numpy as np
+import pandas as pd
+
+CLIENT_CHEQUE_FLOW = ["in_treasury", "under_collection", "collected"]
+SUPPLIER_CHEQUE_FLOW = ["cheque_issued", "cheque_under_collection", "paid"]
+CHEQUE_STATES = CLIENT_CHEQUE_FLOW + SUPPLIER_CHEQUE_FLOW
+CLEARED_STATES = ("collected", "paid")
+AT_RISK_STATES = tuple(s for s in CHEQUE_STATES if s not in CLEARED_STATES)  # cash not yet cleared
+EVENT_COLUMNS = ["Cheque", "Date", "Status"]
+
+class ChequeLog:
+    """Append-only table of cheque status events (Cheque, Date, Status).
+
+    Events are only ever added; a cheque's state at any date is the last event on
+    or before it. Events on the same date keep their arrival order.
+    """
+
+    def __init__(self, events=None):
+        self._parts = []
+        self._events = None
+        if events is not None:
+            self.append(events)
+
+    def __len__(self):
+        return sum(len(p) for p in self._parts)
+
+    def append(self, events):
+        """Add a batch of events (DataFrame with EVENT_COLUMNS)."""
+        missing = [c for c in EVENT_COLUMNS if c not in events]
+        if missing:
+            raise ValueError(f"Cheque events need columns {EVENT_COLUMNS}; missing {missing}")
+        unknown = sorted(set(events["Status"]) - set(CHEQUE_STATES))
+        if unknown:
+            raise ValueError(f"Unknown cheque status: {', '.join(map(str, unknown))}")
+        batch = events[EVENT_COLUMNS].copy()
+        batch["Date"] = pd.to_datetime(batch["Date"]).dt.normalize()
+        self._parts.append(batch)
+        self._events = None
+        return self
+
+    def record(self, cheque, date, status):
+        return self.append(pd.DataFrame([[cheque, date, status]], columns=EVENT_COLUMNS))
+
+    @property
+    def events(self):
+        """All events sorted by (Cheque, Date, arrival); Status as codes into CHEQUE_STATES."""
+        if self._events is None:
+            if self._parts:
+                ev = pd.concat(self._parts, ignore_index=True)
+            else:
+                ev = pd.DataFrame({"Cheque": pd.Series(dtype=object), "Date": pd.Series(dtype="datetime64[ns]"),
+                                   "Status": pd.Series(dtype=object)})
+            ev["Status"] = pd.Categorical(ev["Status"], categories=CHEQUE_STATES)
+            self._events = ev.sort_values(["Cheque", "Date"], kind="stable", ignore_index=True)
+        return self._events
+
+def events_from_snapshot(payments, flow, offsets=(0, 3, 10), cheque="PaymentNo", status="Status",
+                         date="Date", method="Method"):
+    """Simulated event history for cheques known only by their current status.
+
+    A cheque currently at step k of `flow` gets one event per step 0..k, dated
+    `offsets[step]` days after its payment date. Non-cheque rows are skipped. The
+    dates are made up, so time-in-state and daily amounts built on them must be
+    shown as simulated, not as recorded history.
+    """
+    rows = payments[payments[method] == "cheque"] if method in payments else payments
+    step = pd.Index(flow).get_indexer(rows[status])
+    rows, step = rows[step >= 0], step[step >= 0]
+    n = step + 1
+    idx = np.repeat(np.arange(len(rows)), n)
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    return pd.DataFrame({
+        "Cheque": rows[cheque].to_numpy()[idx],
+        "Date": pd.to_datetime(rows[date]).to_numpy()[idx] + pd.to_timedelta(np.asarray(offsets)[k], unit="D"),
+        "Status": np.asarray(flow, dtype=object)[k],
+    })
+
+def _intervals(log, as_of):
+    """Per event on or before as_of: cheque code, state code, start, end (next event of
+    the cheque, else as_of) and whether it is the cheque's latest event by then."""
+    ev = log.events
+    ev = ev[ev["Date"] <= pd.Timestamp(as_of)]
+    codes, cheques = pd.factorize(ev["Cheque"])
+    start = ev["Date"].to_numpy(dtype="datetime64[D]")
+    last = np.r_[codes[1:] != codes[:-1], True][:len(codes)]
+    end = np.empty_like(start)
+    end[:-1] = start[1:]
+    end[last] = np.datetime64(pd.Timestamp(as_of).date(), "D")
+    state = ev["Status"].cat.codes.to_numpy()
+    return codes, pd.Index(cheques, name="Cheque"), state, start, np.maximum(end, start), last
+
+def current_state(log, as_of):
+    """Cheque -> Status, Since (date of the last event), Days (in that state at as_of)."""
+    _, cheques, state, start, end, last = _intervals(log, as_of)
+    return pd.DataFrame({
+        "Status": np.asarray(CHEQUE_STATES, dtype=object)[state[last]],
+        "Since": pd.to_datetime(start[last]),
+        "Days": (end[last] - start[last]).astype(int),
+    }, index=cheques)
+
+def time_in_state(log, as_of):
+    """Cheque x state -> days spent there up to as_of (one bincount over all events)."""
+    codes, cheques, state, start, end, _ = _intervals(log, as_of)
+    ns = len(CHEQUE_STATES)
+    days = np.bincount(codes * ns + state, weights=(end - start).astype(float), minlength=len(cheques) * ns)
+    return pd.DataFrame(days.reshape(len(cheques), ns), index=cheques, columns=CHEQUE_STATES)
+
+def daily_amounts(log, amounts, start, end):
+    """Day x state -> cheque amount sitting in that state, via a difference array.
+
+    `amounts` maps Cheque -> amount. Each event adds its amount on its start day and
+    removes it on the cheque's next event; one cumsum turns that into daily balances.
+    """
+    days = pd.date_range(start, end, freq="D")
+    codes, cheques, state, s, e, _ = _intervals(log, days[-1] + pd.Timedelta(days=1))
+    amt = pd.Series(amounts).reindex(cheques).fillna(0.0).to_numpy(dtype=float)[codes]
+    first = days[0].to_datetime64().astype("datetime64[D]")
+    lo = np.clip((s - first).astype(int), 0, len(days))
+    hi = np.clip((e - first).astype(int), 0, len(days))
+    ns = len(CHEQUE_STATES)
+    diff = (np.bincount(lo * ns + state, weights=amt, minlength=(len(days) + 1) * ns)
+            - np.bincount(hi * ns + state, weights=amt, minlength=(len(days) + 1) * ns))
+    daily = np.cumsum(diff.reshape(len(days) + 1, ns)[:-1], axis=0)
+    return pd.DataFrame(daily, index=pd.Index(days, name="Day"), columns=CHEQUE_STATES)
+
+def cash_at_risk(daily, states=AT_RISK_STATES):
+    """Daily amount held in cheques that have not cleared yet."""
+    return daily[list(states)].sum(axis=1).rename("Cash at risk")
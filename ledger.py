@@ -0,0 +1,395 @@
+# ledger.py
+# Receivables/payables engine: oldest-first payment allocation over invoice ledgers (pandas/numpy only)
+
+import numpy as np
+import pandas as pd
+
+CLIENT_ALLOCATING = ("collected", "under_collection", "in_treasury")
+SUPPLIER_ALLOCATING = ("paid", "cheque_under_collection", "cheque_issued")
+
+_EPS = 1e-6  # overlaps below this are float noise from the shared cumulative axis
+
+def _group_codes(frames, by):
+    """Shared integer codes for the `by` column across frames (None -> one group)."""
+    if by is None:
+        return [np.zeros(len(f), dtype=np.int64) for f in frames]
+    keys = pd.Index(pd.unique(pd.concat([f[by] for f in frames], ignore_index=True)))
+    return [keys.get_indexer(f[by]) for f in frames]
+
+def allocate_fifo(invoices, payments, by=None, due="DueDate", amount="Amount", order="Date"):
+    """Allocate payments to invoices oldest-due first, for every `by` group at once.
+
+    Invoices are laid end to end per group in DueDate order, payments in `order`
+    order; invoice i covers [C[i-1], C[i]) of its group's cumulative amount and
+    payment j covers [Q[j-1], Q[j]). An invoice's allocated amount is the overlap
+    with the group's paid total, and (payment, invoice) pairs are the overlapping
+    intervals, found with searchsorted. Groups are placed on one axis with offsets,
+    so there is no per-group or per-payment loop.
+
+    Returns (allocated per invoice, aligned to invoices.index; pairs DataFrame with
+    Payment/Invoice index labels and Amount).
+    """
+    inv_g, pay_g = _group_codes([invoices, payments], by)
+    n_groups = int(max(inv_g.max(initial=-1), pay_g.max(initial=-1))) + 1
+
+    inv_order = np.lexsort((np.arange(len(invoices)), pd.to_datetime(invoices[due]).to_numpy(), inv_g))
+    pay_order = np.lexsort((np.arange(len(payments)), pd.to_datetime(payments[order]).to_numpy(), pay_g))
+    inv_amt = np.clip(invoices[amount].to_numpy(dtype=float)[inv_order], 0, None)
+    pay_amt = np.clip(payments[amount].to_numpy(dtype=float)[pay_order], 0, None)
+    inv_grp, pay_grp = inv_g[inv_order], pay_g[pay_order]
+
+    # one shared axis: each group gets a span as long as its larger side
+    inv_tot = np.bincount(inv_grp, weights=inv_amt, minlength=n_groups)
+    pay_tot = np.bincount(pay_grp, weights=pay_amt, minlength=n_groups)
+    offset = np.r_[0.0, np.cumsum(np.maximum(inv_tot, pay_tot))[:-1]]
+
+    def spans(grp, amt, tot):
+        end = np.cumsum(amt)
+        before = np.r_[0.0, np.cumsum(tot)][grp]  # cumulative total of earlier groups
+        end = end - before + offset[grp]
+        return end - amt, end
+
+    inv_start, inv_end = spans(inv_grp, inv_amt, inv_tot)
+    pay_start, pay_end = spans(pay_grp, pay_amt, pay_tot)
+
+    paid_to = offset + pay_tot  # per group: axis position up to which invoices are covered
+    allocated_sorted = np.clip(paid_to[inv_grp] - inv_start, 0, inv_amt)
+    allocated = np.empty(len(invoices))
+    allocated[inv_order] = allocated_sorted
+
+    # payment j overlaps invoices first..last (both sorted on the shared axis)
+    first = np.searchsorted(inv_end, pay_start, side="right")
+    last = np.searchsorted(inv_start, pay_end, side="left")
+    counts = np.maximum(last - first, 0)
+    p = np.repeat(np.arange(len(payments)), counts)
+    i = np.repeat(first - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+    overlap = np.minimum(pay_end[p], inv_end[i]) - np.maximum(pay_start[p], inv_start[i])
+    same = (pay_grp[p] == inv_grp[i]) & (overlap > _EPS)
+    pairs = pd.DataFrame({
+        "Payment": payments.index.to_numpy()[pay_order[p[same]]],
+        "Invoice": invoices.index.to_numpy()[inv_order[i[same]]],
+        "Amount": overlap[same],
+    })
+    return pd.Series(allocated, index=invoices.index), pairs
+
+# ---------------- Reconciliation ----------------
+MATCH_RULES = ["reference", "amount", "fifo"]
+OPEN_INVOICE, UNAPPLIED_PAYMENT = "open invoice", "unapplied payment"
+
+def _cumsum_by(values, keys):
+    """Running sum of `values` restarting whenever `keys` (already grouped) changes."""
+    total = np.cumsum(values)
+    if not len(total):
+        return total
+    start = np.r_[True, keys[1:] != keys[:-1]]
+    base = (total - values)[start]
+    return total - np.repeat(base, np.diff(np.r_[np.flatnonzero(start), len(keys)]))
+
+def _take(values, pos):
+    """values[pos] as objects, None where pos is -1 (no counterpart)."""
+    out = np.full(len(pos), None, dtype=object)
+    hit = pos >= 0
+    out[hit] = np.asarray(values, dtype=object)[pos[hit]]
+    return out
+
+def _cents(values):
+    return np.round(values * 100).astype(np.int64)
+
+def reconcile(invoices, payments, by=None, reference="Reference", invoice_no="InvoiceNo", payment_no="PaymentNo",
+              due="DueDate", amount="Amount", order="Date"):
+    """Match payments to invoices: by reference, then by exact amount, then FIFO for the rest.
+
+    1. reference - payment `reference` equals an invoice number in the same `by` group
+       (hash join); several payments on one invoice settle it in payment order.
+    2. amount - untouched payments whose amount equals an untouched invoice's amount,
+       paired one to one in date/due order (hash join on group, cents, occurrence).
+    3. fifo - whatever is left on both sides goes through allocate_fifo.
+
+    Returns (ledger, applied per invoice, unapplied per payment). The ledger has one
+    row per match (Payment/Invoice index labels, Amount, Match = rule) plus one row
+    per open invoice and per unapplied payment; `by`, `invoice_no` and `payment_no`
+    are carried along when present.
+    """
+    inv_amt = np.clip(invoices[amount].to_numpy(dtype=float), 0, None)
+    pay_amt = np.clip(payments[amount].to_numpy(dtype=float), 0, None)
+    inv_left, pay_left = inv_amt.copy(), pay_amt.copy()
+    inv_g, pay_g = _group_codes([invoices, payments], by)
+    inv_due = pd.to_datetime(invoices[due]).to_numpy()
+    pay_date = pd.to_datetime(payments[order]).to_numpy()
+    found = []  # (payment positions, invoice positions, amounts, rule)
+
+    def settle(p, i, applied, rule):
+        keep = applied > _EPS
+        p, i, applied = p[keep], i[keep], applied[keep]
+        inv_left[:] -= np.bincount(i, weights=applied, minlength=len(inv_left))
+        pay_left[:] -= np.bincount(p, weights=applied, minlength=len(pay_left))
+        found.append((p, i, applied, rule))
+
+    if reference in payments and invoice_no in invoices:
+        refs = payments[reference].astype("string").str.strip()
+        has = (refs.notna() & (refs != "")).to_numpy()
+        inv_keys = pd.DataFrame({"g": inv_g, "ref": invoices[invoice_no].astype("string").to_numpy(),
+                                 "i": np.arange(len(invoices))}).drop_duplicates(["g", "ref"])
+        pay_keys = pd.DataFrame({"g": pay_g[has], "ref": refs.to_numpy()[has], "p": np.flatnonzero(has),
+                                 "t": pay_date[has]})
+        hit = pay_keys.merge(inv_keys, on=["g", "ref"]).sort_values(["i", "t", "p"], kind="stable")
+        p, i = hit["p"].to_numpy(), hit["i"].to_numpy()
+        before = _cumsum_by(pay_left[p], i) - pay_left[p]
+        settle(p, i, np.clip(inv_left[i] - before, 0, pay_left[p]), "reference")
+
+    def untouched(left, full, g, when):
+        pos = np.flatnonzero((left > _EPS) & (left == full))
+        frame = pd.DataFrame({"g": g[pos], "c": _cents(left[pos]), "t": when[pos], "pos": pos})
+        frame = frame.sort_values(["t", "pos"], kind="stable")
+        return frame.assign(k=frame.groupby(["g", "c"], sort=False).cumcount())
+
+    pairs = untouched(pay_left, pay_amt, pay_g, pay_date).merge(
+        untouched(inv_left, inv_amt, inv_g, inv_due), on=["g", "c", "k"], suffixes=("_p", "_i"))
+    p, i = pairs["pos_p"].to_numpy(), pairs["pos_i"].to_numpy()
+    settle(p, i, np.minimum(pay_left[p], inv_left[i]), "amount")
+
+    rest_i, rest_p = np.flatnonzero(inv_left > _EPS), np.flatnonzero(pay_left > _EPS)
+    if len(rest_i) and len(rest_p):
+        sub_inv = pd.DataFrame({"g": inv_g[rest_i], due: inv_due[rest_i], amount: inv_left[rest_i]}, index=rest_i)
+        sub_pay = pd.DataFrame({"g": pay_g[rest_p], order: pay_date[rest_p], amount: pay_left[rest_p]}, index=rest_p)
+        _, fifo = allocate_fifo(sub_inv, sub_pay, by="g", due=due, amount=amount, order=order)
+        settle(fifo["Payment"].to_numpy(), fifo["Invoice"].to_numpy(), fifo["Amount"].to_numpy(), "fifo")
+
+    open_i, open_p = np.flatnonzero(inv_left > _EPS), np.flatnonzero(pay_left > _EPS)
+    none_i, none_p = np.full(len(open_p), -1), np.full(len(open_i), -1)
+    p = np.concatenate([f[0] for f in found] + [none_p, open_p])
+    i = np.concatenate([f[1] for f in found] + [open_i, none_i])
+    ledger = pd.DataFrame({
+        "Payment": _take(payments.index, p),
+        "Invoice": _take(invoices.index, i),
+        "Amount": np.concatenate([f[2] for f in found] + [inv_left[open_i], pay_left[open_p]]),
+        "Match": np.repeat([f[3] for f in found] + [OPEN_INVOICE, UNAPPLIED_PAYMENT],
+                           [len(f[0]) for f in found] + [len(open_i), len(open_p)]),
+    })
+    if payment_no in payments:
+        ledger.insert(0, payment_no, _take(payments[payment_no], p))
+    if invoice_no in invoices:
+        ledger.insert(0, invoice_no, _take(invoices[invoice_no], i))
+    if by is not None:
+        ledger.insert(0, by, np.where(i >= 0, _take(invoices[by], i), _take(payments[by], p)))
+    applied = pd.Series(inv_amt - np.maximum(inv_left, 0), index=invoices.index)
+    unapplied = pd.Series(np.maximum(pay_left, 0), index=payments.index)
+    return ledger, applied, unapplied
+
+def reconciled(invoices, payments, allocating_statuses, by=None, status="Status", paid_col="Collected"):
+    """(invoices plus `paid_col` and Outstanding, reconciliation ledger).
+
+    Only payments whose status is in `allocating_statuses` take part.
+    """
+    eligible = payments[payments[status].isin(allocating_statuses)]
+    ledger, applied, _ = reconcile(invoices, eligible, by=by)
+    out = invoices.copy()
+    out[paid_col] = applied
+    out["Outstanding"] = out["Amount"] - out[paid_col]
+    return out, ledger
+
+def outstanding(invoices, payments, allocating_statuses, by=None, status="Status", paid_col="Collected"):
+    """Invoices plus `paid_col` (matched, see reconcile) and Outstanding."""
+    return reconciled(invoices, payments, allocating_statuses, by, status, paid_col)[0]
+
+# ---------------- Aging ----------------
+AGING_BUCKETS = ["Current", "1–30", "31–60", "61–90", "90+"]
+_AGING_EDGES = np.array([1, 31, 61, 91])  # first day past due of each overdue bucket
+
+def aging(invoices, as_of, by=None, due="DueDate", balance="Outstanding"):
+    """Outstanding balances per (group, aging bucket) in one bincount.
+
+    Rows = groups (a single 'All' row when `by` is None), columns = AGING_BUCKETS.
+    """
+    days = (pd.Timestamp(as_of) - pd.to_datetime(invoices[due])).dt.days.to_numpy()
+    bucket = np.searchsorted(_AGING_EDGES, days, side="right")
+    if by is None:
+        keys, codes = pd.Index(["All"]), np.zeros(len(invoices), dtype=np.int64)
+    else:
+        codes, keys = pd.factorize(invoices[by], sort=True)
+        keys = pd.Index(keys, name=by)
+    amounts = np.clip(invoices[balance].to_numpy(dtype=float), 0, None)
+    nb = len(AGING_BUCKETS)
+    sums = np.bincount(codes * nb + bucket, weights=amounts, minlength=len(keys) * nb)
+    return pd.DataFrame(sums.reshape(len(keys), nb), index=keys, columns=AGING_BUCKETS)
+
+def aging_summary(receivables, payables, as_of, by="Entity"):
+    """Per-entity AR and AP aging side by side: columns (AR|AP, bucket) plus totals."""
+    sides = {}
+    for side, invoices in (("AR", receivables), ("AP", payables)):
+        buckets = aging(invoices, as_of, by)
+        sides[side] = buckets.assign(Total=buckets.sum(axis=1))
+    return pd.concat(sides, axis=1).fillna(0.0)
+
+# ---------------- Entity summary ----------------
+CLIENT_DUES_ACCOUNTS = {"Advance to Adjust": "Adv_Client", "Retention": "Retention_AR"}
+SUPPLIER_DUES_ACCOUNTS = {"Advance Payments": "Adv_Supplier", "Performance Bonds": "Retention_AP"}
+CHEQUE_ACCOUNTS = {"under_collection": "Cheques_UC", "in_treasury": "Cheques_Treasury"}
+
+def _sum_by(frame, by, column=None, value="Amount", rename=None):
+    """One grouped sum: by -> value column(s), or by x column -> values (filtered/renamed via `rename`)."""
+    if column is None:
+        return frame.groupby(by, sort=False)[value].sum().rename(columns=rename)
+    if rename is not None:
+        frame = frame[frame[column].isin(list(rename))]
+    out = frame.groupby([by, column], sort=False)[value].sum().unstack(column)
+    return out.rename(columns=rename) if rename is not None else out
+
+def entity_summary(entities, receivables, payables, client_payments, client_dues, supplier_dues,
+                   n_months=12, by="Entity", name="Name"):
+    """KPI table for every entity, indexed by entity name.
+
+    `receivables`/`payables` are invoice tables already run through outstanding().
+    Each source table is aggregated once by entity; the ratios are then columns of
+    one frame, so looking an entity up is a single .loc.
+    """
+    base = entities.set_index(name)
+    parts = [
+        _sum_by(receivables, by, value=["Amount", "Outstanding"], rename={"Amount": "Revenue", "Outstanding": "AR"}),
+        _sum_by(payables, by, value=["Amount", "Outstanding"], rename={"Amount": "Cost", "Outstanding": "AP"}),
+        _sum_by(client_payments, by, "Status", rename=CHEQUE_ACCOUNTS),
+        _sum_by(client_dues, by, "Item", rename=CLIENT_DUES_ACCOUNTS),
+        _sum_by(supplier_dues, by, "Item", rename=SUPPLIER_DUES_ACCOUNTS),
+    ]
+    kpi_cols = (["Revenue", "AR", "Cost", "AP"] + list(CHEQUE_ACCOUNTS.values())
+                + list(CLIENT_DUES_ACCOUNTS.values()) + list(SUPPLIER_DUES_ACCOUNTS.values()))
+    kpis = pd.concat(parts, axis=1).reindex(index=base.index, columns=kpi_cols).fillna(0.0).astype(float)
+    out = base.join(kpis)
+
+    cheques = out["Cheques_UC"] + out["Cheques_Treasury"]
+    out["Net Exposure"] = (out["AR"] - out["AP"] + out["Adv_Client"] - out["Adv_Supplier"]
+                           + out["Retention_AR"] - out["Retention_AP"] + cheques)
+    avg_rev = np.maximum(out["Revenue"] / n_months, 1.0)
+    avg_cost = np.maximum(out["Cost"] / n_months, 1.0)
+    out["DSO"] = out["AR"] / avg_rev * 30.0
+    out["DPO"] = out["AP"] / avg_cost * 30.0
+    limit = out["CreditLimit"].astype(float)
+    exposure = np.maximum(out["AR"] + cheques, 0.0)
+    out["Credit Utilization"] = np.where(limit > 0, exposure / limit.where(limit > 0, 1.0), 0.0)
+    return out
+
+def entity_rows(frame, name, by="Entity"):
+    """Rows of one entity from a frame sorted by `by` (two binary searches, no mask)."""
+    keys = frame[by].to_numpy()
+    lo, hi = np.searchsorted(keys, name, side="left"), np.searchsorted(keys, name, side="right")
+    return frame.iloc[lo:hi]
+
+# ---------------- Demo data ----------------
+def generate_entity_data(n_entities=5_000, seed=0, year=2025):
+    """Random counterparties with invoices, payments and dues, shaped like the Entity Dashboard tables.
+
+    Dates are datetime64; every table carries an Entity column. Deterministic for a
+    given seed.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Entity {k:05d}" for k in range(1, n_entities + 1)], dtype=object)
+    is_client = rng.random(n_entities) < 0.8
+    is_supplier = ~is_client | (rng.random(n_entities) < 0.5)
+    types = np.where(is_client & is_supplier, "Client, Supplier", np.where(is_client, "Client", "Supplier"))
+    start = pd.Timestamp(year, 1, 1)
+
+    entities = pd.DataFrame({
+        "Name": names,
+        "Type": types,
+        "Status": rng.choice(["Active", "Active", "Active", "On Hold"], n_entities),
+        "Owner": rng.choice(["Sales Team A", "Sales Team B", "Procurement", "Key Accounts"], n_entities),
+        "Email": [f"ops{k:05d}@example.com" for k in range(1, n_entities + 1)],
+        "Phone": [f"+20 10 {k:04d} {k % 10_000:04d}" for k in range(1, n_entities + 1)],
+        "Address": rng.choice(["Cairo, Egypt", "Giza, Egypt", "Alexandria, Egypt", "New Cairo, Cairo, Egypt"],
+                              n_entities),
+        "CreditLimit": rng.integers(5, 300, n_entities) * 10_000.0,
+        "PaymentTermsDays": rng.choice([30, 45, 60, 90], n_entities),
+        "RiskScore": rng.random(n_entities).round(2),
+        "Currency": "EGP",
+    })
+
+    def rows(active, lo, hi):
+        counts = np.where(active, rng.integers(lo, hi + 1, n_entities), 0)
+        return np.repeat(np.arange(n_entities), counts)
+
+    def numbers(prefix, n):
+        return prefix + pd.Series(np.arange(1, n + 1)).astype(str).str.zfill(7)
+
+    def dates(n, days):
+        return start + pd.to_timedelta(rng.integers(0, days, n), unit="D")
+
+    def remittance(pay_owner, inv_owner, invoices, amounts):
+        """Payments quoting one of their entity's invoices (about half), or paying one exactly."""
+        per_entity = np.bincount(inv_owner, minlength=n_entities)
+        counts = per_entity[pay_owner]
+        pick = (np.cumsum(per_entity) - per_entity)[pay_owner] + (rng.random(len(pay_owner)) * counts).astype(np.int64)
+        pick = np.minimum(pick, max(len(invoices) - 1, 0))
+        roll = rng.random(len(pay_owner))
+        quoted, exact = (counts > 0) & (roll < 0.5), (counts > 0) & (roll >= 0.5) & (roll < 0.7)
+        if not len(invoices):
+            return np.full(len(pay_owner), "", dtype=object), amounts
+        refs = np.where(quoted, invoices["InvoiceNo"].to_numpy(dtype=object)[pick], "")
+        return refs, np.where(exact, invoices["Amount"].to_numpy()[pick], amounts)
+
+    ci = rows(is_client, 0, 8)
+    ci_date = dates(len(ci), 181)
+    client_invoices = pd.DataFrame({
+        "InvoiceNo": numbers("CI-", len(ci)),
+        "Date": ci_date,
+        "DueDate": ci_date + pd.to_timedelta(entities["PaymentTermsDays"].to_numpy()[ci], unit="D"),
+        "Amount": rng.integers(20, 400, len(ci)) * 1_000,
+        "Notes": rng.choice(["Progress", "Variation", "Mobilization", "Final"], len(ci)),
+        "Entity": names[ci],
+    })
+
+    si = rows(is_supplier, 0, 8)
+    si_date = dates(len(si), 181)
+    suppliers = rng.choice(["Supplier A", "Supplier B", "Supplier C", "Supplier D"], len(si))
+    supplier_invoices = pd.DataFrame({
+        "InvoiceNo": numbers("SI-", len(si)),
+        "Supplier": suppliers,
+        "Date": si_date,
+        "DueDate": si_date + pd.to_timedelta(45, unit="D"),
+        "Amount": rng.integers(20, 250, len(si)) * 1_000,
+        "Entity": names[si],
+    })
+
+    cp = rows(is_client, 0, 6)
+    client_payments = pd.DataFrame({
+        "PaymentNo": numbers("CP-", len(cp)),
+        "Date": dates(len(cp), 200),
+        "Amount": rng.integers(10, 300, len(cp)) * 1_000,
+        "Method": rng.choice(["cheque", "transfer"], len(cp), p=[0.7, 0.3]),
+        "Status": rng.choice(list(CLIENT_ALLOCATING), len(cp), p=[0.6, 0.25, 0.15]),
+        "Entity": names[cp],
+    })
+    client_payments.loc[client_payments["Method"] == "transfer", "Status"] = "collected"
+    client_payments["Reference"], client_payments["Amount"] = remittance(cp, ci, client_invoices,
+                                                                         client_payments["Amount"].to_numpy())
+
+    sp = rows(is_supplier, 0, 6)
+    supplier_payments = pd.DataFrame({
+        "PaymentNo": numbers("SP-", len(sp)),
+        "Date": dates(len(sp), 200),
+        "Amount": rng.integers(10, 200, len(sp)) * 1_000,
+        "Method": rng.choice(["cheque", "transfer"], len(sp), p=[0.6, 0.4]),
+        "Status": rng.choice(list(SUPPLIER_ALLOCATING), len(sp), p=[0.6, 0.2, 0.2]),
+        "Counterparty": rng.choice(["Supplier A", "Supplier B", "Supplier C", "Supplier D"], len(sp)),
+        "Entity": names[sp],
+    })
+    supplier_payments.loc[supplier_payments["Method"] == "transfer", "Status"] = "paid"
+    supplier_payments["Reference"], supplier_payments["Amount"] = remittance(sp, si, supplier_invoices,
+                                                                             supplier_payments["Amount"].to_numpy())
+
+    def dues(active, items):
+        owner = np.repeat(np.flatnonzero(active), len(items))
+        return pd.DataFrame({
+            "Item": np.tile(items, int(active.sum())),
+            "Amount": rng.integers(0, 60, len(owner)) * 5_000,
+            "Entity": names[owner],
+        })
+
+    return {
+        "entities": entities,
+        "client_invoices": client_invoices,
+        "supplier_invoices": supplier_invoices,
+        "client_payments": client_payments,
+        "supplier_payments": supplier_payments,
+        "client_dues_items": dues(is_client, ["Retention", "Advance to Adjust", "Insurance", "Other Deductions"]),
+        "supplier_dues_items": dues(is_supplier, ["Advance Payments", "Insurance", "Performance Bonds", "Penalties"]),
+    }
@@ -2,8 +2,19 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import date
-import json
+from copy import deepcopy
+
+from budget_catalogs import CATALOG_DIMS, MAX_OPTIONS, Catalog, catalog_issues, parse_catalog_text, read_catalog_file
+from budget_engine import BudgetCube
+from budget_grid import (SPREAD_PERIODS, SPREAD_PROFILES, BudgetGrid, DuplicateValidator, GridTotals, calendar_profile,
+                         editor_changes, parse_multi, period_totals, profile_weights, spread_periods, spread_totals,
+                         to_long_format)
+from budget_io import budget_json_bytes, download_widget, read_budget_export, read_budget_template
+from budget_merge import merge_uploads
+from budget_store import open_store
+from budget_tables import MONTH_WINDOW, month_windows
 
 st.set_page_config(page_title="Create Budget", layout="wide")
 st.title("🧪 Create Budget")
@@ -16,34 +27,6 @@ def month_range(start_dt: date, end_dt: date):
         s, e = e, s
     return pd.date_range(s, e, freq="MS")
 
-def parse_multi(cell):
-    """Turn cell (str/list/None) into list[str] using , or ; separators."""
-    if isinstance(cell, list):
-        return [str(x).strip() for x in cell if str(x).strip()]
-    if pd.isna(cell) or cell is None:
-        return []
-    s = str(cell).strip()
-    if not s:
-        return []
-    parts = [p.strip() for p in s.replace(";", ",").split(",")]
-    return [p for p in parts if p]
-
-def make_empty_grid(items, months, extra_cols, multi_cols):
-    cols = ["Item"] + extra_cols + [m.strftime("%Y-%m") for m in months]
-    df = pd.DataFrame(columns=cols)
-    if items:
-        df["Item"] = items
-    # init months
-    for m in [m.strftime("%Y-%m") for m in months]:
-        df[m] = 0
-    # init dims
-    for c in extra_cols:
-        if c in multi_cols:
-            df[c] = [[] for _ in range(len(df))]
-        else:
-            df[c] = ""
-    return df
-
 def normalize_dimension_columns(df, extra_cols, multi_cols):
     """Ensure proper Python types post-edit/import."""
     if df is None:
@@ -56,48 +39,30 @@ def normalize_dimension_columns(df, extra_cols, multi_cols):
             df[c] = df[c].apply(lambda v: "" if pd.isna(v) else str(v).strip())
     return df
 
-def to_long_format(grid_df, months_cols, meta, extra_cols, multi_cols):
-    rows = []
-    for _, row in grid_df.iterrows():
-        item_name = str(row.get("Item", "")).strip()
-        for m in months_cols:
-            val = pd.to_numeric(row.get(m, 0), errors="coerce")
-            val = 0.0 if pd.isna(val) else float(val)
-            entry = {
-                "Budget": meta["budget_name"],
-                "Version": meta["version"],
-                "BudgetType": meta["budget_type"],
-                "Project": meta.get("project_name") if meta["budget_type"] == "Project" else "",
-                "Currency": meta["currency"],
-                "Month": pd.to_datetime(m + "-01"),
-                "Item": item_name,
-                "Planned": val,
-            }
-            for c in extra_cols:
-                v = row.get(c, [] if c in multi_cols else "")
-                entry[c] = ";".join(parse_multi(v)) if c in multi_cols else ("" if pd.isna(v) else str(v))
-            rows.append(entry)
-    return pd.DataFrame(rows).sort_values(["Item", "Month"]).reset_index(drop=True)
-
-def find_duplicate_assignments(df, extra_cols, multi_cols):
-    issues = {}
-    if df is None or df.empty:
-        return issues
-    for c in extra_cols:
-        used = {}
-        if c in multi_cols:
-            for i, vals in enumerate(df[c].apply(parse_multi).tolist()):
-                for v in vals:
-                    used.setdefault(v, set()).add(i + 1)  # 1-based row index
-        else:
-            for i, v in enumerate(df[c].tolist()):
-                v = "" if pd.isna(v) else str(v).strip()
-                if v:
-                    used.setdefault(v, set()).add(i + 1)
-        dups = [(val, sorted(list(rows))) for val, rows in used.items() if len(rows) > 1]
-        if dups:
-            issues[c] = dups
-    return issues
+@st.cache_resource
+def get_store():
+    # Same local store the dashboard reads (seeded with the sample data on first run)
+    return open_store()
+
+@st.cache_resource(show_spinner=False)
+def load_reference_cube(data_version):
+    # Source of other versions' actuals for the "Copy actuals" spread profile
+    return BudgetCube(get_store().load())
+
+@st.cache_resource(show_spinner=False)
+def catalog_from_text(dim, text):
+    return Catalog(dim, parse_catalog_text(text))
+
+@st.cache_resource(show_spinner=False)
+def catalog_from_file(dim, data, file_name):
+    return Catalog(dim, read_catalog_file(data, file_name, dim))
+
+def used_values(df, col, multi):
+    """Distinct values currently in a grid column (kept selectable even if filtered out)."""
+    if col not in df or df.empty:
+        return []
+    values = df[col].explode() if multi else df[col]
+    return [v for v in pd.unique(values.dropna().astype(str)) if v]
 
 # ---------------- Sidebar: metadata ----------------
 st.sidebar.header("Budget Metadata")
@@ -124,14 +89,27 @@ extra_cols = st.sidebar.multiselect(
 )
 multi_cols = {"Entity", "Asset"}  # allow many links per line
 
-# Catalogs
+# Catalogs (file upload or typed list; parsed once per content and cached as indexed Catalogs)
 with st.sidebar.expander("📚 Dimension catalogs"):
-    def _parse_catalog(label, default_lines):
-        txt = st.text_area(label, value="\n".join(default_lines), height=100)
-        return [x.strip() for x in txt.splitlines() if x.strip()]
-    entity_options = _parse_catalog("Entities (one per line)", ["E001", "E002", "E003"])
-    costcenter_options = _parse_catalog("Cost Centers (one per line)", ["CC-Admin", "CC-OPS", "CC-ENG"])
-    asset_options = _parse_catalog("Assets (one per line)", ["AS-TRUCK-01", "AS-GEN-02", "AS-CRANE-03"])
+    def _catalog(dim, label, default_lines):
+        up_cat = st.file_uploader(f"{label} file (.txt/.csv/.xlsx)", type=["txt", "csv", "xlsx"], key=f"cat_file_{dim}")
+        if up_cat is not None:
+            return catalog_from_file(dim, up_cat.getvalue(), up_cat.name)
+        txt = st.text_area(f"{label} (one per line)", value="\n".join(default_lines), height=100, key=f"cat_text_{dim}")
+        return catalog_from_text(dim, txt)
+    catalogs = {
+        "Entity": _catalog("Entity", "Entities", ["E001", "E002", "E003"]),
+        "CostCenter": _catalog("CostCenter", "Cost Centers", ["CC-Admin", "CC-OPS", "CC-ENG"]),
+        "Asset": _catalog("Asset", "Assets", ["AS-TRUCK-01", "AS-GEN-02", "AS-CRANE-03"]),
+    }
+    # Large catalogs are never sent whole to the editor: a search narrows the options list
+    catalog_search = {}
+    for dim in CATALOG_DIMS:
+        if len(catalogs[dim]) > MAX_OPTIONS:
+            catalog_search[dim] = st.text_input(f"Find {dim} ({len(catalogs[dim]):,} in catalog)", key=f"cat_q_{dim}")
+            if catalog_search[dim]:
+                st.caption(", ".join(catalogs[dim].search(catalog_search[dim], 20)) or "No matches.")
+            st.caption(f"Editor lists up to {MAX_OPTIONS} matches plus values already in the grid.")
 
 # ---------------- Months ----------------
 months = month_range(start_month, end_month)
@@ -140,10 +118,11 @@ month_labels = [m.strftime("%Y-%m") for m in months]
 # ---------------- Import / template ----------------
 st.subheader("1) Items, Dimensions & Monthly Planned amounts")
 
-with st.expander("📥 Import from CSV/Excel (optional)", expanded=False):
+with st.expander("📥 Import from CSV/Excel or a previous export (optional)", expanded=False):
     st.markdown(
         "- **Template** columns: `Item`, your selected dimensions, then months `YYYY-MM`.\n"
-        "- For multi dims (Entity/Asset) use **semicolon or comma** : `E001;E002`."
+        "- For multi dims (Entity/Asset) use **semicolon or comma** : `E001;E002`.\n"
+        "- Budgets exported below as **JSON** or **Parquet** can be loaded back as well."
     )
     tmpl_cols = ["Item"] + extra_cols + month_labels
     tmpl_df = pd.DataFrame(columns=tmpl_cols)
@@ -155,69 +134,155 @@ with st.expander("📥 Import from CSV/Excel (optional)", expanded=False):
         key="dl_tmpl"
     )
 
-    up = st.file_uploader("Upload CSV or Excel to prefill the grid", type=["csv", "xlsx"])
-    uploaded_df = None
+    up = st.file_uploader("Upload CSV, Excel, JSON or Parquet to prefill the grid", type=["csv", "xlsx", "json", "parquet"])
+    uploaded_grid = None
+    # Stream each upload once (per month range/dims); later reruns keep the edited grid
+    import_key = None
     if up is not None:
-        if up.name.lower().endswith(".csv"):
-            uploaded_df = pd.read_csv(up)
+        import_key = (getattr(up, "file_id", None), up.name, up.size, tuple(month_labels), tuple(extra_cols))
+    if up is not None and st.session_state.get("import_key") != import_key:
+        bar = st.progress(0.0, text=f"Reading {up.name}...")
+
+        def _progress(rows, fraction):
+            bar.progress(fraction if fraction is not None else 0.0, text=f"Read {rows:,} rows of {up.name}")
+
+        if up.name.lower().endswith((".json", ".parquet")):
+            # Exported long format -> wide grid in one pivot
+            problems = []
+            try:
+                long_df, file_meta = read_budget_export(up.getvalue(), up.name)
+            except ValueError as exc:
+                problems.append(str(exc))
+            else:
+                uploaded_grid = BudgetGrid.from_long(long_df, month_labels, extra_cols, multi_cols)
+                outside = (~long_df["Month"].dt.strftime("%Y-%m").isin(month_labels)).sum()
+                if outside:
+                    problems.append(f"{outside:,} rows outside the selected months were ignored")
+                missing = [c for c in extra_cols if c not in long_df]
+                if missing:
+                    problems.append(f"Dimensions not in the file: {', '.join(missing)}")
+                if file_meta:
+                    problems.append(f"File is {file_meta.get('budget_name', '?')} • {file_meta.get('version', '?')} "
+                                    f"({file_meta.get('currency', '')}); set the sidebar metadata to match if needed")
         else:
-            uploaded_df = pd.read_excel(up)
-        for col in ["Item"] + extra_cols:
-            if col not in uploaded_df.columns:
-                uploaded_df[col] = "" if col != "Item" else uploaded_df.get("Item", "")
-        for m in month_labels:
-            if m not in uploaded_df.columns:
-                uploaded_df[m] = 0
-        uploaded_df = uploaded_df[["Item"] + extra_cols + month_labels]
-        uploaded_df = normalize_dimension_columns(uploaded_df, extra_cols, multi_cols)
+            uploaded_df, problems = read_budget_template(up, up.name, month_labels, extra_cols, multi_cols,
+                                                         catalogs=catalogs, progress=_progress)
+            if uploaded_df is not None:
+                uploaded_grid = BudgetGrid.from_frame(uploaded_df, month_labels, extra_cols)
+        bar.empty()
+        st.session_state["import_key"] = import_key
+        st.session_state["import_report"] = (None if uploaded_grid is None else len(uploaded_grid), problems)
+    if up is not None:
+        n_rows, problems = st.session_state.get("import_report", (None, []))
+        if n_rows is not None:
+            st.caption(f"Imported {n_rows:,} rows from {up.name}.")
+        if problems:
+            st.warning("Import notes:\n" + "\n".join(f"- {p}" for p in problems))
 
 # ---------------- Init state ----------------
 default_items = ["Rentals", "Fuel", "Construction", "Salaries", "Marketing", "Equipment"]
+grid_rebuilt = False  # True when the grid was replaced wholesale this run (reset/import)
 
 if (
-    "grid_df" not in st.session_state
+    "grid" not in st.session_state
     or st.session_state.get("grid_months") != month_labels
     or st.session_state.get("grid_extras") != tuple(extra_cols)
 ):
-    st.session_state["grid_df"] = make_empty_grid(default_items, months, extra_cols, multi_cols)
+    st.session_state["grid"] = BudgetGrid.empty(default_items, month_labels, extra_cols, multi_cols)
     st.session_state["grid_months"] = month_labels
     st.session_state["grid_extras"] = tuple(extra_cols)
+    grid_rebuilt = True
 
-if uploaded_df is not None:
-    st.session_state["grid_df"] = uploaded_df.copy()
+if uploaded_grid is not None:
+    st.session_state["grid"] = uploaded_grid
+    grid_rebuilt = True
 
-grid_df = st.session_state["grid_df"]
+if st.session_state.pop("grid_replaced", False):  # e.g. merged department budgets loaded last run
+    grid_rebuilt = True
+
+# The model (dims + numeric month block) stays in session; the editor gets one year at a time
+grid = st.session_state["grid"]
+windows = month_windows(months, MONTH_WINDOW)
+if len(windows) > 1:
+    window_label = st.radio("Editing months", [label for label, _ in windows], horizontal=True, key="grid_window")
+    window = dict(windows)[window_label]
+else:
+    window = slice(None)
+window_months = month_labels[window]
+editor_key = f"grid_editor_{window_months[0] if window_months else 'empty'}"
+
+# ---------------- Spread totals ----------------
+with st.expander("📐 Spread totals across months", expanded=False):
+    sc1, sc2 = st.columns(2)
+    spread_profile = sc1.selectbox("Profile", SPREAD_PROFILES, key="spread_profile")
+    spread_period = sc2.selectbox("Totals are for", SPREAD_PERIODS, key="spread_period")
+    period_labels, period_codes = spread_periods(month_labels, spread_period)
+
+    seasonal, decay, reference = None, 0.85, None
+    if spread_profile == "Seasonal":
+        season_df = st.data_editor(pd.DataFrame([np.ones(12)], columns=[f"{m:%b}" for m in pd.date_range("2000-01-01", periods=12, freq="MS")]),
+                                   hide_index=True, use_container_width=True, key="spread_season")
+        seasonal = season_df.iloc[0].to_numpy(dtype=float)
+    elif spread_profile == "Front-loaded":
+        decay = st.slider("Month-over-month factor", 0.5, 1.0, 0.85, 0.01, key="spread_decay")
+    elif spread_profile == "Copy actuals":
+        ref_cube = load_reference_cube(get_store().data_version())
+        rc1, rc2 = st.columns(2)
+        ref_budget = rc1.selectbox("From budget", list(ref_cube.budgets), key="spread_ref_budget")
+        ref_version = rc2.selectbox("Version", ref_cube.versions_for(ref_budget), key="spread_ref_version")
+        reference = calendar_profile(ref_cube.slice(ref_budget, ref_version).item_month("Actual"), grid.meta["Item"])
+        st.caption("Items without actuals in that version are spread flat.")
+
+    # One total per grid row and period; defaults to the grid's current totals
+    totals_df = pd.DataFrame(period_totals(grid.values, period_codes, len(period_labels)), columns=period_labels)
+    totals_df.insert(0, "Item", grid.meta["Item"].to_numpy(dtype=object))
+    spread_input = st.data_editor(totals_df, disabled=["Item"], num_rows="fixed", hide_index=True,
+                                  use_container_width=True, key=f"spread_totals_{spread_period}")
+    if st.button("Apply spread to grid", key="spread_apply"):
+        weights = profile_weights(spread_profile, month_labels, seasonal=seasonal, decay=decay,
+                                  reference=reference, period_codes=period_codes)
+        period_input = spread_input[period_labels].to_numpy(dtype=float)
+        if not (np.isfinite(period_input).all() and np.isfinite(weights).all()):
+            st.warning("Empty totals or profile weights were treated as 0.")
+        grid.values[:] = spread_totals(period_input, weights, period_codes)
+        st.session_state.pop(editor_key, None)  # drop stale cell edits so the editor shows the spread
+        grid_rebuilt = True
+
+grid_df = grid.frame(window)
 
 # ---------------- Build inline editors with fallback ----------------
 has_multi = hasattr(st.column_config, "MultiSelectColumn")
 has_select = hasattr(st.column_config, "SelectboxColumn")
 
+def dim_options(dim):
+    return catalogs[dim].options(catalog_search.get(dim, ""), keep=used_values(grid.meta, dim, dim in multi_cols))
+
 cfg = {}
 cfg["Item"] = st.column_config.TextColumn("Item", help="Budget line item / category")
 
 # Month numeric editors
-for m in month_labels:
+for m in window_months:
     cfg[m] = st.column_config.NumberColumn(m, min_value=0.0, step=1.0, help="Planned amount")
 
 # Build the editable DataFrame and column editors
 if has_multi:
     # We can pass list-typed columns directly
     if "Entity" in extra_cols:
-        cfg["Entity"] = st.column_config.MultiSelectColumn("Entity", options=entity_options, help="Select one or more Entities")
+        cfg["Entity"] = st.column_config.MultiSelectColumn("Entity", options=dim_options("Entity"), help="Select one or more Entities")
     if "CostCenter" in extra_cols:
         if has_select:
-            cfg["CostCenter"] = st.column_config.SelectboxColumn("CostCenter", options=[""] + costcenter_options, help="Single selection")
+            cfg["CostCenter"] = st.column_config.SelectboxColumn("CostCenter", options=[""] + dim_options("CostCenter"), help="Single selection")
         else:
             cfg["CostCenter"] = st.column_config.TextColumn("CostCenter", help="Type a value")
     if "Asset" in extra_cols:
-        cfg["Asset"] = st.column_config.MultiSelectColumn("Asset", options=asset_options, help="Select one or more Assets")
+        cfg["Asset"] = st.column_config.MultiSelectColumn("Asset", options=dim_options("Asset"), help="Select one or more Assets")
 
     edited = st.data_editor(
         grid_df,
         num_rows="dynamic",
         column_config=cfg,
         use_container_width=True,
-        key="grid_editor",
+        key=editor_key,
     )
 
     # Normalize types after edit (MultiSelect returns lists)
@@ -237,7 +302,7 @@ else:
         cfg["Entity"] = st.column_config.TextColumn("Entity", help="Enter values from catalog, e.g. E001;E002")
     if "CostCenter" in extra_cols:
         if has_select:
-            cfg["CostCenter"] = st.column_config.SelectboxColumn("CostCenter", options=[""] + costcenter_options, help="Single selection")
+            cfg["CostCenter"] = st.column_config.SelectboxColumn("CostCenter", options=[""] + dim_options("CostCenter"), help="Single selection")
         else:
             cfg["CostCenter"] = st.column_config.TextColumn("CostCenter", help="Type a cost center")
     if "Asset" in extra_cols:
@@ -248,15 +313,11 @@ else:
         num_rows="dynamic",
         column_config=cfg,
         use_container_width=True,
-        key="grid_editor",
+        key=editor_key,
     )
 
     # Convert back: strings -> lists for multi dims; keep text for singles
-    edited = grid_df.copy()
-    # Push simple columns (Item + months + CostCenter string)
-    for col in ["Item"] + month_labels + ([ "CostCenter" ] if "CostCenter" in extra_cols else []):
-        if col in edited_display.columns:
-            edited[col] = edited_display[col]
+    edited = edited_display.copy()
     # Parse multi dims back to lists
     for c in extra_cols:
         if c in multi_cols and c in edited_display.columns:
@@ -265,12 +326,24 @@ else:
     # Normalize types
     edited = normalize_dimension_columns(edited, extra_cols, multi_cols)
 
-# Persist
-st.session_state["grid_df"] = edited
-grid_df = edited
+# Persist (in place: dims for all rows, months for the shown window)
+grid.apply(edited, window)
+
+# ---------------- Edit deltas (since the previous rerun) ----------------
+# Switching windows swaps editor widgets, which counts as a structural change
+editor_state = st.session_state.get(editor_key)
+prev_key, prev_state = st.session_state.get("grid_editor_prev", (None, None))
+changed_cells, structural = editor_changes(prev_state if prev_key == editor_key else None, editor_state)
+structural = structural or grid_rebuilt
+st.session_state["grid_editor_prev"] = (editor_key, deepcopy(editor_state))
 
 # ---------------- Validation (no duplicates across rows) ----------------
-issues = find_duplicate_assignments(grid_df, extra_cols, multi_cols)
+# Links are exploded once and kept in session; only rows whose dims changed are re-checked
+validator = st.session_state.get("dup_validator")
+if validator is None or not validator.matches(extra_cols, multi_cols):
+    validator = st.session_state["dup_validator"] = DuplicateValidator(extra_cols, multi_cols)
+dim_rows = {row for row, col in changed_cells if col in extra_cols}
+issues = validator.validate(grid.meta, None if structural else dim_rows)
 if issues:
     st.error("🚫 Duplicate dimension assignments detected. Fix these before export:")
     for dim, vals in issues.items():
@@ -279,19 +352,32 @@ if issues:
 else:
     st.success("✅ No duplicate dimension assignments.")
 
+# Catalog membership, checked on the same links table (one hashed lookup per dim)
+unknown = catalog_issues(validator.links, {c: catalogs[c] for c in extra_cols if c in catalogs})
+if unknown:
+    st.warning("⚠️ Some dimension values are not in the catalogs:")
+    for dim, vals in unknown.items():
+        for v, rows in vals[:20]:
+            st.write(f"- **{dim}** `{v}` in rows: {rows}")
+        if len(vals) > 20:
+            st.write(f"- … and {len(vals) - 20:,} more {dim} values")
+
 # ---------------- Totals preview ----------------
+# Totals live in session and are patched by the edited cells' deltas; full recompute only on structural changes
+totals = st.session_state.setdefault("grid_totals", GridTotals())
+totals.update(grid.months_frame(), month_labels, changed_cells, structural)
+
 with st.expander("👀 Preview Totals", expanded=False):
-    numeric = grid_df[month_labels].apply(pd.to_numeric, errors="coerce").fillna(0)
-    row_totals = numeric.sum(axis=1)
-    prev = grid_df[["Item"] + [c for c in extra_cols]].copy()
+    row_totals = pd.Series(totals.row, index=grid.meta.index)
+    prev = grid.meta[["Item"] + [c for c in extra_cols]].copy()
     if "Entity" in extra_cols:
-        prev["#Entities"] = grid_df["Entity"].apply(lambda x: len(parse_multi(x)))
+        prev["#Entities"] = grid.meta["Entity"].apply(lambda x: len(parse_multi(x)))
     if "Asset" in extra_cols:
-        prev["#Assets"] = grid_df["Asset"].apply(lambda x: len(parse_multi(x)))
+        prev["#Assets"] = grid.meta["Asset"].apply(lambda x: len(parse_multi(x)))
     prev["Row Total Planned"] = row_totals
     st.dataframe(prev, use_container_width=True)
 
-    col_totals = numeric.sum(axis=0)
+    col_totals = pd.Series(totals.month, index=month_labels)
     st.write("Per-Month Totals:")
     st.dataframe(col_totals.to_frame(name="Planned").T, use_container_width=True)
 
@@ -323,27 +409,82 @@ if issues:
 if errors:
     st.error(" • " + "\n • ".join(errors))
 else:
-    long_df = to_long_format(grid_df, month_labels, meta, extra_cols, multi_cols)
+    # Files are built only when requested (not on every rerun)
+    def build_long():
+        long_df = to_long_format(grid.frame(), month_labels, meta, extra_cols, multi_cols)
+        long_df.attrs["budget_meta"] = meta  # kept in Parquet metadata for re-import
+        return long_df
+
+    def encode_json(long_df, fmt, file_stem):
+        return budget_json_bytes(long_df, meta)
+
+    # Save the version into the local store (replaces an existing version with the same label)
+    store = get_store()
+    exists = store.has_version(meta["budget_name"], meta["version"])
+    overwrite = True
+    if exists:
+        overwrite = st.checkbox(f"Overwrite saved {meta['budget_name']} • {meta['version']}", value=False, key="save_overwrite")
+    if st.button("💾 Save version to store", disabled=not overwrite, key="save_version"):
+        with st.spinner("Saving..."):
+            n_saved = store.save_version(build_long(), meta)
+        st.success(f"Saved {meta['budget_name']} • {meta['version']} ({n_saved:,} changed cells stored). It is now available in the dashboard.")
+
     c1, c2 = st.columns(2)
-    c1.download_button(
-        "⬇️ Export Planned as CSV (long format)",
-        long_df.to_csv(index=False).encode("utf-8"),
-        file_name=f"{meta['budget_name']}_{meta['version']}_planned.csv",
-        mime="text/csv",
-        key="dl_csv"
+    download_widget(
+        "⬇️ Export Planned (long format)",
+        build_long,
+        file_stem=f"{meta['budget_name']}_{meta['version']}_planned",
+        key="dl_csv",
+        container=c1,
     )
-    payload = {
-        "meta": meta,
-        "data": long_df.assign(Month=lambda d: d["Month"].dt.strftime("%Y-%m-%d")).to_dict(orient="records")
-    }
-    c2.download_button(
+    download_widget(
         "⬇️ Export Budget as JSON",
-        json.dumps(payload, indent=2).encode("utf-8"),
-        file_name=f"{meta['budget_name']}_{meta['version']}.json",
-        mime="application/json",
-        key="dl_json"
+        build_long,
+        file_stem=f"{meta['budget_name']}_{meta['version']}",
+        key="dl_json",
+        formats={"JSON": (".json", "application/json")},
+        encode=encode_json,
+        container=c2,
     )
 
+# ---------------- Merge department uploads ----------------
+st.subheader("3) Merge department budgets")
+
+with st.expander("🏢 Merge many template files (one per department)", expanded=False):
+    st.caption("Files must follow the template above. They are parsed in parallel; files with errors or "
+               "duplicate dimension assignments are left out of the merge, and the merge cannot be loaded "
+               "while departments assign the same dimension value.")
+    dept_files = st.file_uploader("Department files", type=["csv", "xlsx"], accept_multiple_files=True, key="merge_files")
+    if st.button("Merge files", disabled=not dept_files, key="merge_run"):
+        bar = st.progress(0.0, text="Parsing files...")
+        merged, merge_report, cross_issues = merge_uploads(
+            [(f.name, f.getvalue()) for f in dept_files], month_labels, extra_cols, multi_cols, meta,
+            catalogs={c: catalogs[c] for c in extra_cols if c in catalogs},
+            progress=lambda done, total: bar.progress(done / total, text=f"Parsed {done} of {total} files"),
+        )
+        bar.empty()
+        st.session_state["merge_result"] = (merged, merge_report, cross_issues)
+
+    if "merge_result" in st.session_state:
+        merged, merge_report, cross_issues = st.session_state["merge_result"]
+        st.dataframe(merge_report, hide_index=True, use_container_width=True)
+        if cross_issues:
+            st.error("🚫 The same dimension value is assigned in more than one department:")
+            for dim, vals in cross_issues.items():
+                for v, where in vals:
+                    st.write(f"- **{dim}** `{v}`: {', '.join(where)}")
+        if not merged.empty:
+            st.write(f"Merged {merge_report['Status'].eq('merged').sum()} files into {len(merged):,} long-format rows.")
+            mc1, mc2 = st.columns(2)
+            download_widget("⬇️ Export merged budget", lambda: merged,
+                            file_stem=f"{meta['budget_name']}_{meta['version']}_merged", key="dl_merged", container=mc1)
+            if mc2.button("Load merged budget into the grid", key="merge_load", disabled=bool(cross_issues),
+                          help="Resolve the cross-department duplicates first." if cross_issues else None):
+                st.session_state["grid"] = BudgetGrid.from_long(merged, month_labels, extra_cols, multi_cols)
+                st.session_state["grid_replaced"] = True
+                st.session_state.pop(editor_key, None)
+                st.rerun()
+
 st.caption(
     "Inline editors enabled when available. On older Streamlit, type multi values as 'A;B;C'. "
     "Duplicates across rows are disallowed at export."
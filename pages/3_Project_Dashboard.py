@@ -7,6 +7,10 @@ import numpy as np
 import altair as alt
 from datetime import date
 
+from cheques import (CLIENT_CHEQUE_FLOW, SUPPLIER_CHEQUE_FLOW, ChequeLog, cash_at_risk, current_state,
+                     daily_amounts, events_from_snapshot, time_in_state)
+from ledger import CLIENT_ALLOCATING, SUPPLIER_ALLOCATING, reconciled
+
 st.set_page_config(page_title="Project Dashboard", layout="wide")
 
 # ===================== THEME & STYLES =====================
@@ -47,6 +51,7 @@ master = {
 
 # Months of the year
 months = pd.date_range("2025-01-01", "2025-12-01", freq="MS")
+AS_OF = date(2025, 7, 31)  # treasury cut-off of the demo data
 
 # Planned budget (per month) — totals
 rng = np.random.RandomState(20)
@@ -80,43 +85,41 @@ budget_items = pd.DataFrame([
     ["Variation Revenue", 350_000, 320_000, "Revenue"],
 ], columns=["Item","Planned","Actual","Type"])
 
-# Client & Supplier invoices (kept for display lists)
+# Client & Supplier invoices (Collected/Paid come from reconciliation below)
 client_invoices = pd.DataFrame([
-    ["PHX-INV-001","2025-01-20","2025-02-20", 240_000, 160_000, "Mobilization"],
-    ["PHX-INV-002","2025-02-25","2025-03-27", 260_000, 260_000, "Progress #1"],
-    ["PHX-INV-003","2025-03-25","2025-04-26", 310_000,  90_000, "Progress #2"],
-    ["PHX-INV-004","2025-04-28","2025-05-28", 295_000,   0,      "Variation #1"],
-    ["PHX-INV-005","2025-05-25","2025-06-25", 320_000, 200_000, "Progress #3"],
-], columns=["InvoiceNo","Date","DueDate","Amount","Collected","Notes"])
+    ["PHX-INV-001","2025-01-20","2025-02-20", 240_000, "Mobilization"],
+    ["PHX-INV-002","2025-02-25","2025-03-27", 260_000, "Progress #1"],
+    ["PHX-INV-003","2025-03-25","2025-04-26", 310_000, "Progress #2"],
+    ["PHX-INV-004","2025-04-28","2025-05-28", 295_000, "Variation #1"],
+    ["PHX-INV-005","2025-05-25","2025-06-25", 320_000, "Progress #3"],
+], columns=["InvoiceNo","Date","DueDate","Amount","Notes"])
 for c in ["Date","DueDate"]:
     client_invoices[c] = pd.to_datetime(client_invoices[c]).dt.date
-client_invoices["Outstanding"] = client_invoices["Amount"] - client_invoices["Collected"]
 
 supplier_invoices = pd.DataFrame([
-    ["PHX-SUP-001","Supplier A","2025-01-18","2025-03-04", 160_000, 160_000],
-    ["PHX-SUP-002","Supplier B","2025-02-10","2025-03-27", 120_000,  70_000],
-    ["PHX-SUP-003","Supplier C","2025-03-05","2025-04-20", 210_000,  80_000],
-    ["PHX-SUP-004","Supplier A","2025-04-12","2025-05-27", 140_000,  60_000],
-    ["PHX-SUP-005","Supplier D","2025-05-19","2025-07-03", 180_000,   0],
-], columns=["InvoiceNo","Supplier","Date","DueDate","Amount","Paid"])
+    ["PHX-SUP-001","Supplier A","2025-01-18","2025-03-04", 160_000],
+    ["PHX-SUP-002","Supplier B","2025-02-10","2025-03-27", 120_000],
+    ["PHX-SUP-003","Supplier C","2025-03-05","2025-04-20", 210_000],
+    ["PHX-SUP-004","Supplier A","2025-04-12","2025-05-27", 140_000],
+    ["PHX-SUP-005","Supplier D","2025-05-19","2025-07-03", 180_000],
+], columns=["InvoiceNo","Supplier","Date","DueDate","Amount"])
 for c in ["Date","DueDate"]:
     supplier_invoices[c] = pd.to_datetime(supplier_invoices[c]).dt.date
-supplier_invoices["Outstanding"] = supplier_invoices["Amount"] - supplier_invoices["Paid"]
 
-# Client & Supplier payments (for cashflow)
+# Client & Supplier payments (for cashflow). Reference = invoice number quoted on the remittance.
 client_payments = pd.DataFrame([
-    ["PHX-PAY-001","2025-02-05", 160_000,"cheque","collected"],
-    ["PHX-PAY-002","2025-03-10",  90_000,"cheque","under_collection"],
-    ["PHX-PAY-003","2025-04-02", 200_000,"transfer","collected"],
-    ["PHX-PAY-004","2025-05-15", 110_000,"cheque","under_collection"],
-], columns=["PaymentNo","Date","Amount","Method","Status"])
+    ["PHX-PAY-001","2025-02-05", 160_000,"cheque","collected","PHX-INV-001"],
+    ["PHX-PAY-002","2025-03-10",  90_000,"cheque","under_collection","PHX-INV-003"],
+    ["PHX-PAY-003","2025-04-02", 200_000,"transfer","collected","PHX-INV-005"],
+    ["PHX-PAY-004","2025-05-15", 110_000,"cheque","under_collection",""],
+], columns=["PaymentNo","Date","Amount","Method","Status","Reference"])
 client_payments["Date"] = pd.to_datetime(client_payments["Date"]).dt.date
 
 supplier_payments = pd.DataFrame([
-    ["PHX-SPY-001","2025-03-07", 70_000,"cheque","cheque_issued","Supplier B"],
-    ["PHX-SPY-002","2025-03-22", 80_000,"cheque","cheque_under_collection","Supplier C"],
-    ["PHX-SPY-003","2025-04-29", 60_000,"transfer","paid","Supplier A"],
-], columns=["PaymentNo","Date","Amount","Method","Status","Supplier"])
+    ["PHX-SPY-001","2025-03-07", 70_000,"cheque","cheque_issued","Supplier B","PHX-SUP-002"],
+    ["PHX-SPY-002","2025-03-22", 80_000,"cheque","cheque_under_collection","Supplier C",""],
+    ["PHX-SPY-003","2025-04-29", 60_000,"transfer","paid","Supplier A","PHX-SUP-004"],
+], columns=["PaymentNo","Date","Amount","Method","Status","Supplier","Reference"])
 supplier_payments["Date"] = pd.to_datetime(supplier_payments["Date"]).dt.date
 
 # Dues by item (static totals per your request)
@@ -149,6 +152,11 @@ employees["MonthlyCost"] = employees["CostRate"] * employees["AllocationPct"]
 # ===================== CALCS =====================
 def money(v): return f"{v:,.0f}"
 
+# Collected / Paid: payments matched by reference, then amount, then oldest-due-first (ledger.reconcile)
+client_invoices, client_recon = reconciled(client_invoices, client_payments, CLIENT_ALLOCATING, paid_col="Collected")
+supplier_invoices, supplier_recon = reconciled(supplier_invoices, supplier_payments, SUPPLIER_ALLOCATING,
+                                               by="Supplier", paid_col="Paid")
+
 executed_revenue = budget_df["Revenue"].sum()
 executed_cost    = budget_df["Cost"].sum()
 profit           = executed_revenue - executed_cost
@@ -172,6 +180,18 @@ cash["Cash Out"] = cashout
 cash = cash.fillna(0.0)
 cash["Net Cash"] = cash["Cash In"] - cash["Cash Out"]
 
+# Cheque lifecycle (status events -> current state, time in state, daily balances)
+@st.cache_data(show_spinner=False)
+def cheque_snapshots(payments, flow, as_of):
+    """(per-cheque state + days in each state, daily amount per state) for one payments table."""
+    log = ChequeLog(events_from_snapshot(payments, flow))
+    state = current_state(log, as_of).join(time_in_state(log, as_of)[flow])
+    daily = daily_amounts(log, payments.set_index("PaymentNo")["Amount"], months[0], as_of)[flow]
+    return state, daily
+
+client_cheques, client_cheque_days = cheque_snapshots(client_payments, CLIENT_CHEQUE_FLOW, AS_OF)
+supplier_cheques, supplier_cheque_days = cheque_snapshots(supplier_payments, SUPPLIER_CHEQUE_FLOW, AS_OF)
+
 # ===================== HEADER =====================
 st.title("🏗️ Project Dashboard")
 st.write(f"**Project:** {PROJECT}  •  **Client:** {master['Client']}")
@@ -197,9 +217,9 @@ with r1c4:
                 f'<div class="metric-sub">Margin: {margin_pct:.2f}%</div></div>', unsafe_allow_html=True)
 
 # KPIs Row 2 (cheques/dues quick view)
-cheques_under_collection = client_payments.query("Method=='cheque' and Status=='under_collection'")["Amount"].sum()
-client_collected         = client_payments.query("Status=='collected'")["Amount"].sum()
-supplier_cheques_out     = supplier_payments.query("Status in ['cheque_issued','cheque_under_collection']")["Amount"].sum()
+cheques_under_collection = client_cheque_days["under_collection"].iloc[-1]
+client_collected         = client_payments.loc[client_payments["Status"].eq("collected"), "Amount"].sum()
+supplier_cheques_out     = supplier_cheque_days[["cheque_issued","cheque_under_collection"]].iloc[-1].sum()
 supplier_total_invoices  = supplier_invoices["Amount"].sum()
 
 r2c1, r2c2, r2c3, r2c4 = st.columns(4)
@@ -312,6 +332,55 @@ with i_right:
     si_tot = supplier_invoices[["Amount","Paid","Outstanding"]].sum()
     st.markdown(f"**Total** — Amount: {money(si_tot['Amount'])} • Paid: {money(si_tot['Paid'])} • Outstanding: {money(si_tot['Outstanding'])}")
 
+# ===================== RECONCILIATION =====================
+st.markdown("## <span>Payment Reconciliation</span>", unsafe_allow_html=True)
+r_left, r_right = st.columns(2)
+
+with r_left:
+    st.markdown("#### Client receipts ↔ invoices")
+    st.dataframe(
+        client_recon[["InvoiceNo","PaymentNo","Amount","Match"]].style.format({"Amount":money}),
+        use_container_width=True, hide_index=True
+    )
+    unapplied = client_recon.loc[client_recon["Match"]=="unapplied payment","Amount"].sum()
+    st.markdown(f"**Matched:** {money(client_invoices['Collected'].sum())} • Unapplied receipts: {money(unapplied)}")
+
+with r_right:
+    st.markdown("#### Supplier payments ↔ invoices")
+    st.dataframe(
+        supplier_recon[["Supplier","InvoiceNo","PaymentNo","Amount","Match"]].style.format({"Amount":money}),
+        use_container_width=True, hide_index=True
+    )
+    unapplied = supplier_recon.loc[supplier_recon["Match"]=="unapplied payment","Amount"].sum()
+    st.markdown(f"**Matched:** {money(supplier_invoices['Paid'].sum())} • Unapplied payments: {money(unapplied)}")
+
+# ===================== CHEQUE LIFECYCLE =====================
+st.markdown("## <span>Cheque Lifecycle</span>", unsafe_allow_html=True)
+q_left, q_right = st.columns([3, 2])
+
+with q_left:
+    at_risk = pd.DataFrame({
+        "Client cheques": cash_at_risk(client_cheque_days, ["in_treasury","under_collection"]),
+        "Supplier cheques": cash_at_risk(supplier_cheque_days, ["cheque_issued","cheque_under_collection"]),
+    }).rename_axis("Day").reset_index().melt(id_vars="Day", var_name="Side", value_name="Amount")
+    chart = alt.Chart(at_risk).mark_line(interpolate="step-after", strokeWidth=2).encode(
+        x=alt.X("Day:T", title=None),
+        y=alt.Y("Amount:Q", title="Cash at risk"),
+        color=alt.Color("Side:N", scale=alt.Scale(range=["#2563EB","#dc2626"])),
+        tooltip=["Day:T","Side",alt.Tooltip("Amount:Q", format=",.0f")]
+    ).properties(height=260, title=f"Uncleared cheques per day (to {AS_OF})")
+    st.altair_chart(chart, use_container_width=True)
+
+with q_right:
+    lifecycle = pd.concat([client_cheques, supplier_cheques]).fillna(0.0)
+    day_cols = [c for c in lifecycle.columns if c not in ("Status","Since","Days")]
+    st.dataframe(
+        lifecycle.reset_index()
+            .style.format({"Since":"{:%Y-%m-%d}", **{c:"{:.0f}" for c in day_cols}}),
+        use_container_width=True, hide_index=True
+    )
+    st.caption("Days = time in the current state; state columns = days spent in each state.")
+
 # ===================== DUES TOTALS (by item) =====================
 st.markdown("## <span>Dues — Totals by Item</span>", unsafe_allow_html=True)
 d_left, d_right = st.columns(2)
@@ -357,4 +426,4 @@ with e_right:
                 f'<div class="metric-sub">Allocated across roles</div>'
                 '</div>', unsafe_allow_html=True)
 
-st.caption("Static demo data shown. When ready, replace the DATA block with your API calls and keep the same column names to reuse the visuals.")
+st.caption("Static demo data shown (invoice Collected/Paid are reconciled from the payments). When ready, replace the DATA block with your API calls and keep the same column names to reuse the visuals.")
@@ -1,5 +1,5 @@
 # pages/4_Entity_Dashboard.py
-# ENTITY Dashboard (static demo data now; swap DATA block with API calls later)
+# ENTITY Dashboard (static demo entity + generated counterparties; swap DATA block with API calls later)
 
 import streamlit as st
 import pandas as pd
@@ -7,6 +7,11 @@ import numpy as np
 import altair as alt
 from datetime import date
 
+from cheques import (CLIENT_CHEQUE_FLOW, SUPPLIER_CHEQUE_FLOW, ChequeLog, cash_at_risk, current_state,
+                     daily_amounts, events_from_snapshot)
+from ledger import (AGING_BUCKETS, CLIENT_ALLOCATING, SUPPLIER_ALLOCATING, aging_summary, entity_rows,
+                    entity_summary, generate_entity_data, reconciled)
+
 st.set_page_config(page_title="Entity Dashboard", layout="wide")
 
 # ===================== THEME & STYLES =====================
@@ -46,6 +51,8 @@ ENTITY = {
 }
 
 # Months of the year
+DEMO_ENTITIES = 5_000          # generated counterparties listed next to the static entity
+AS_OF = date(2025, 7, 31)  # ledger cut-off of the demo data (default aging date)
 months = pd.date_range("2025-01-01", "2025-12-01", freq="MS")
 
 # Invoices we issued to this entity (if Client) -> REVENUE
@@ -59,6 +66,7 @@ client_invoices = pd.DataFrame([
 ], columns=["InvoiceNo","Date","DueDate","Amount","Notes"])
 for c in ["Date","DueDate"]:
     client_invoices[c] = pd.to_datetime(client_invoices[c]).dt.date
+client_invoices["Entity"] = ENTITY["Name"]
 
 # Invoices they issued to us (if Supplier) -> COST
 supplier_invoices = pd.DataFrame([
@@ -71,25 +79,29 @@ supplier_invoices = pd.DataFrame([
 ], columns=["InvoiceNo","Supplier","Date","DueDate","Amount"])
 for c in ["Date","DueDate"]:
     supplier_invoices[c] = pd.to_datetime(supplier_invoices[c]).dt.date
+supplier_invoices["Entity"] = ENTITY["Name"]
 
 # Receipts from the client (cash-in). Cheque statuses include in_treasury / under_collection / collected.
+# Reference = invoice number quoted on the remittance (blank when none).
 client_payments = pd.DataFrame([
-    ["AT-PAY-001","2025-02-05", 160_000,"cheque","collected"],
-    ["AT-PAY-002","2025-03-10",  90_000,"cheque","under_collection"],
-    ["AT-PAY-003","2025-03-15",  60_000,"cheque","in_treasury"],
-    ["AT-PAY-004","2025-04-02", 200_000,"transfer","collected"],
-    ["AT-PAY-005","2025-05-15", 110_000,"cheque","under_collection"],
-], columns=["PaymentNo","Date","Amount","Method","Status"])
+    ["AT-PAY-001","2025-02-05", 160_000,"cheque","collected","AT-INV-001"],
+    ["AT-PAY-002","2025-03-10",  90_000,"cheque","under_collection",""],
+    ["AT-PAY-003","2025-03-15",  60_000,"cheque","in_treasury",""],
+    ["AT-PAY-004","2025-04-02", 200_000,"transfer","collected","AT-INV-002"],
+    ["AT-PAY-005","2025-05-15", 110_000,"cheque","under_collection",""],
+], columns=["PaymentNo","Date","Amount","Method","Status","Reference"])
 client_payments["Date"] = pd.to_datetime(client_payments["Date"]).dt.date
+client_payments["Entity"] = ENTITY["Name"]
 
 # Payments we made to the supplier (cash-out). Cheque handover = issued/under_collection.
 supplier_payments = pd.DataFrame([
-    ["AT-SPY-001","2025-03-07", 70_000,"cheque","cheque_issued","Supplier B"],
-    ["AT-SPY-002","2025-03-22", 80_000,"cheque","cheque_under_collection","Supplier C"],
-    ["AT-SPY-003","2025-04-29", 60_000,"transfer","paid","Supplier A"],
-    ["AT-SPY-004","2025-06-10", 75_000,"transfer","paid","Supplier B"],
-], columns=["PaymentNo","Date","Amount","Method","Status","Counterparty"])
+    ["AT-SPY-001","2025-03-07", 70_000,"cheque","cheque_issued","Supplier B",""],
+    ["AT-SPY-002","2025-03-22", 80_000,"cheque","cheque_under_collection","Supplier C","AT-SUP-003"],
+    ["AT-SPY-003","2025-04-29", 60_000,"transfer","paid","Supplier A","AT-SUP-004"],
+    ["AT-SPY-004","2025-06-10", 75_000,"transfer","paid","Supplier B",""],
+], columns=["PaymentNo","Date","Amount","Method","Status","Counterparty","Reference"])
 supplier_payments["Date"] = pd.to_datetime(supplier_payments["Date"]).dt.date
+supplier_payments["Entity"] = ENTITY["Name"]
 
 # Contracts / POs / RFQs / Offers with this entity (static demo)
 contracts = pd.DataFrame([
@@ -98,6 +110,7 @@ contracts = pd.DataFrame([
     ["C-002","Pending", 900_000,"2025-06-01","Pending Approval"],
 ], columns=["ContractNo","Type","Amount","Date","Status"])
 contracts["Date"] = pd.to_datetime(contracts["Date"]).dt.date
+contracts["Entity"] = ENTITY["Name"]
 
 purchase_orders = pd.DataFrame([
     ["PO-1001","Open", 220_000,"2025-02-12"],
@@ -105,6 +118,7 @@ purchase_orders = pd.DataFrame([
     ["PO-1003","Open", 180_000,"2025-05-21"],
 ], columns=["PONo","Status","Amount","Date"])
 purchase_orders["Date"] = pd.to_datetime(purchase_orders["Date"]).dt.date
+purchase_orders["Entity"] = ENTITY["Name"]
 
 rfqs = pd.DataFrame([
     ["RFQ-01","Offer Sent", 300_000,"2025-02-08"],
@@ -112,6 +126,7 @@ rfqs = pd.DataFrame([
     ["RFQ-03","Offer Failed", 180_000,"2025-04-11"],
 ], columns=["RFQNo","Status","QuotedAmount","Date"])
 rfqs["Date"] = pd.to_datetime(rfqs["Date"]).dt.date
+rfqs["Entity"] = ENTITY["Name"]
 
 # Dues by item (totals)
 client_dues_items = pd.DataFrame([
@@ -120,15 +135,117 @@ client_dues_items = pd.DataFrame([
     ["Insurance",        110_000],
     ["Other Deductions",  60_000],
 ], columns=["Item","Amount"])
+client_dues_items["Entity"] = ENTITY["Name"]
 supplier_dues_items = pd.DataFrame([
     ["Advance Payments", 130_000],
     ["Insurance",         75_000],
     ["Performance Bonds", 40_000],
     ["Penalties",         25_000],
 ], columns=["Item","Amount"])
+supplier_dues_items["Entity"] = ENTITY["Name"]
+
+# ===================== ALL ENTITIES (computed once, cached) =====================
+LEDGER_TABLES = ["client_invoices", "supplier_invoices", "client_payments", "supplier_payments",
+                 "client_dues_items", "supplier_dues_items", "client_recon", "supplier_recon"]
+
+@st.cache_resource(show_spinner="Loading entity ledgers…")
+def load_ledgers(n_demo):
+    """Static entity + generated ones; every table sorted by Entity, invoices reconciled against payments."""
+    demo = generate_entity_data(n_demo)
+    static = {
+        "entities": pd.DataFrame([{**ENTITY, "Type": ", ".join(ENTITY["Type"])}]),
+        "client_invoices": client_invoices, "supplier_invoices": supplier_invoices,
+        "client_payments": client_payments, "supplier_payments": supplier_payments,
+        "client_dues_items": client_dues_items, "supplier_dues_items": supplier_dues_items,
+    }
+    data = {}
+    for name, frame in static.items():
+        gen = demo[name].copy()
+        for c in ("Date", "DueDate"):
+            if c in gen:
+                gen[c] = gen[c].dt.date
+        key = "Name" if name == "entities" else "Entity"
+        data[name] = pd.concat([frame, gen], ignore_index=True).sort_values(key, kind="stable", ignore_index=True)
+    data["client_invoices"], recon = reconciled(data["client_invoices"], data["client_payments"], CLIENT_ALLOCATING,
+                                                by="Entity", paid_col="Collected")
+    data["client_recon"] = recon.sort_values("Entity", kind="stable", ignore_index=True)
+    data["supplier_invoices"], recon = reconciled(data["supplier_invoices"], data["supplier_payments"],
+                                                  SUPPLIER_ALLOCATING, by="Entity", paid_col="Paid")
+    data["supplier_recon"] = recon.sort_values("Entity", kind="stable", ignore_index=True)
+    data["client_cheques"] = ChequeLog(events_from_snapshot(data["client_payments"], CLIENT_CHEQUE_FLOW))
+    data["supplier_cheques"] = ChequeLog(events_from_snapshot(data["supplier_payments"], SUPPLIER_CHEQUE_FLOW))
+    return data
+
+@st.cache_data(show_spinner=False)
+def entity_kpis(n_demo):
+    """KPI row per entity: one grouped aggregation per source table."""
+    d = load_ledgers(n_demo)
+    return entity_summary(d["entities"], d["client_invoices"], d["supplier_invoices"], d["client_payments"],
+                          d["client_dues_items"], d["supplier_dues_items"], n_months=len(months))
+
+@st.cache_data(show_spinner=False)
+def aging_table(n_demo, as_of):
+    """AR/AP aging for every entity in one pass; the page looks its entity up by name."""
+    d = load_ledgers(n_demo)
+    return aging_summary(d["client_invoices"], d["supplier_invoices"], as_of, by="Entity")
+
+@st.cache_data(show_spinner=False)
+def cheque_states(n_demo, as_of):
+    """Current state (+ days in it) of every cheque, client and supplier side."""
+    d = load_ledgers(n_demo)
+    return pd.concat([current_state(d["client_cheques"], as_of), current_state(d["supplier_cheques"], as_of)])
+
+@st.cache_data(show_spinner=False)
+def cheque_daily(n_demo, entity, start, end):
+    """Daily cheque balances per state for one entity (difference array over its events)."""
+    d = load_ledgers(n_demo)
+    out = {}
+    for side in ("client", "supplier"):
+        pays = entity_rows(d[f"{side}_payments"], entity)
+        log = d[f"{side}_cheques"]
+        log = ChequeLog(log.events[log.events["Cheque"].isin(pays["PaymentNo"])])
+        out[side] = daily_amounts(log, pays.set_index("PaymentNo")["Amount"], start, end)
+    return out["client"][CLIENT_CHEQUE_FLOW].join(out["supplier"][SUPPLIER_CHEQUE_FLOW])
+
+summary = entity_kpis(DEMO_ENTITIES)
+ledgers = load_ledgers(DEMO_ENTITIES)
+
+# ===================== ENTITY PICKER =====================
+st.title("👤 Entity Dashboard")
+entity_names = summary.index
+entity_name = st.selectbox("Entity", entity_names, index=entity_names.get_loc(ENTITY["Name"]), key="entity")
+ent = summary.loc[entity_name]
+
+with st.expander("⚠️ Riskiest entities — credit utilization", expanded=False):
+    top_n = st.number_input("Show top", min_value=5, max_value=len(summary), value=min(25, len(summary)),
+                            step=5, key="risk_top_n")
+    risky = summary.nlargest(int(top_n), "Credit Utilization")[
+        ["Type", "Owner", "CreditLimit", "AR", "Cheques_UC", "Cheques_Treasury", "Net Exposure",
+         "Credit Utilization", "RiskScore"]]
+    st.dataframe(
+        risky.style.format({"CreditLimit":"{:,.0f}","AR":"{:,.0f}","Cheques_UC":"{:,.0f}",
+                            "Cheques_Treasury":"{:,.0f}","Net Exposure":"{:,.0f}",
+                            "Credit Utilization":"{:.0%}","RiskScore":"{:.2f}"}),
+        use_container_width=True
+    )
+    st.caption(f"{len(summary):,} entities • {int((summary['Credit Utilization'] > 1).sum()):,} over their credit limit. "
+               "Click a column header to sort.")
+
+# This entity's rows (tables are sorted by Entity, so each lookup is a slice)
+(client_invoices, supplier_invoices, client_payments, supplier_payments, client_dues_items, supplier_dues_items,
+ client_recon, supplier_recon) = (entity_rows(ledgers[name], entity_name) for name in LEDGER_TABLES)
+contracts, purchase_orders, rfqs = (entity_rows(t, entity_name) for t in (contracts, purchase_orders, rfqs))
+
+# Cheque lifecycle: current state per cheque + cached daily balances for this entity.
+# There is no recorded event log yet: event dates are simulated from each payment's current
+# status (events_from_snapshot), so time-in-state columns and charts are labelled as such.
+states = cheque_states(DEMO_ENTITIES, AS_OF).rename(columns={"Since": "Since (simulated)", "Days": "Days (simulated)"})
+cheque_days = cheque_daily(DEMO_ENTITIES, entity_name, months[0], AS_OF)
+client_payments = client_payments.join(states, on="PaymentNo", rsuffix="_now")
+supplier_payments = supplier_payments.join(states, on="PaymentNo", rsuffix="_now")
 
 # ===================== HELPERS / CALCS =====================
-CURRENCY = ENTITY["Currency"]
+CURRENCY = ent["Currency"]
 def money(v): return f"{v:,.0f}"
 
 def month_start(d):
@@ -158,41 +275,15 @@ cf["Cash Out"] = cash_out
 cf = cf.fillna(0.0)
 cf["Net Cash"] = cf["Cash In"] - cf["Cash Out"]
 
-# Outstanding calculations
-client_invoices["Collected"] = 0.0
-for _, p in client_payments.iterrows():
-    # naive allocation across oldest first
-    remain = p["Amount"] if p["Status"] in ("collected","under_collection","in_treasury") else 0
-    for i in client_invoices.sort_values("DueDate").index:
-        due = client_invoices.loc[i, "Amount"] - client_invoices.loc[i, "Collected"]
-        if due <= 0: continue
-        alloc = min(remain, due)
-        client_invoices.loc[i, "Collected"] += alloc
-        remain -= alloc
-        if remain <= 0: break
-client_invoices["Outstanding"] = client_invoices["Amount"] - client_invoices["Collected"]
-
-supplier_invoices["Paid"] = 0.0
-for _, p in supplier_payments.iterrows():
-    if p["Status"] not in ("paid","cheque_under_collection","cheque_issued"): continue
-    remain = p["Amount"]
-    for i in supplier_invoices.sort_values("DueDate").index:
-        due = supplier_invoices.loc[i, "Amount"] - supplier_invoices.loc[i, "Paid"]
-        if due <= 0: continue
-        alloc = min(remain, due)
-        supplier_invoices.loc[i, "Paid"] += alloc
-        remain -= alloc
-        if remain <= 0: break
-supplier_invoices["Outstanding"] = supplier_invoices["Amount"] - supplier_invoices["Paid"]
-
-AR = float(client_invoices["Outstanding"].sum())                 # accounts receivable from this entity
-AP = float(supplier_invoices["Outstanding"].sum())               # accounts payable to this entity
-Cheques_UC = float(client_payments.query("Status=='under_collection'")["Amount"].sum())
-Cheques_Treasury = float(client_payments.query("Status=='in_treasury'")["Amount"].sum())
-Adv_Client = float(client_dues_items.loc[client_dues_items["Item"]=="Advance to Adjust","Amount"].sum())
-Adv_Supplier = float(supplier_dues_items.loc[supplier_dues_items["Item"]=="Advance Payments","Amount"].sum())
-Retention_AR = float(client_dues_items.loc[client_dues_items["Item"]=="Retention","Amount"].sum())
-Retention_AP = float(supplier_dues_items.loc[supplier_dues_items["Item"]=="Performance Bonds","Amount"].sum())
+# Balances come precomputed from the entity summary (outstanding = reference/amount matches, then FIFO)
+AR = float(ent["AR"])                 # accounts receivable from this entity
+AP = float(ent["AP"])                 # accounts payable to this entity
+Cheques_UC = float(ent["Cheques_UC"])
+Cheques_Treasury = float(ent["Cheques_Treasury"])
+Adv_Client = float(ent["Adv_Client"])
+Adv_Supplier = float(ent["Adv_Supplier"])
+Retention_AR = float(ent["Retention_AR"])
+Retention_AP = float(ent["Retention_AP"])
 
 # Account group rollup (the "bring all accounts" panel)
 accounts = pd.DataFrame([
@@ -206,23 +297,20 @@ accounts = pd.DataFrame([
     ["Cheques in Treasury", Cheques_Treasury],
 ], columns=["Account Group","Balance"])
 accounts["Balance"] = accounts["Balance"].astype(float)
-net_exposure = accounts["Balance"].sum()
+net_exposure = float(ent["Net Exposure"])
 
 # KPIs / Risk
-avg_month_rev = max(rc["Revenue"].mean(), 1.0)
-avg_month_cost = max(rc["Cost"].mean(), 1.0)
-DSO = (AR / avg_month_rev) * 30.0 if avg_month_rev else 0.0
-DPO = (AP / avg_month_cost) * 30.0 if avg_month_cost else 0.0
-credit_util = (max(AR + Cheques_UC + Cheques_Treasury, 0.0) / ENTITY["CreditLimit"]) if ENTITY["CreditLimit"] else 0.0
+DSO = float(ent["DSO"])
+DPO = float(ent["DPO"])
+credit_util = float(ent["Credit Utilization"])
 
 # ===================== HEADER / PROFILE =====================
-st.title("👤 Entity Dashboard")
 st.write(
-    f"**Entity:** {ENTITY['Name']} &nbsp;&nbsp;•&nbsp;&nbsp; "
-    f"**Type:** {', '.join(ENTITY['Type'])} &nbsp;&nbsp;•&nbsp;&nbsp; "
-    f"**Owner:** {ENTITY['Owner']}"
+    f"**Entity:** {entity_name} &nbsp;&nbsp;•&nbsp;&nbsp; "
+    f"**Type:** {ent['Type']} &nbsp;&nbsp;•&nbsp;&nbsp; "
+    f"**Owner:** {ent['Owner']}"
 )
-st.write(f"📍 {ENTITY['Address']}  &nbsp;&nbsp; ✉️  {ENTITY['Email']}  &nbsp;&nbsp; ☎️  {ENTITY['Phone']}")
+st.write(f"📍 {ent['Address']}  &nbsp;&nbsp; ✉️  {ent['Email']}  &nbsp;&nbsp; ☎️  {ent['Phone']}")
 
 # KPI cards
 k1, k2, k3, k4 = st.columns(4)
@@ -239,8 +327,8 @@ with k3:
                 f'<div class="metric">{money(net_exposure)} {CURRENCY}</div>'
                 f'<div class="metric-sub">AR + Advances + Cheques − AP</div></div>', unsafe_allow_html=True)
 with k4:
-    pill = ('<span class="pill bad">High Risk</span>' if ENTITY["RiskScore"]>=0.66
-            else '<span class="pill warn">Medium Risk</span>' if ENTITY["RiskScore"]>=0.33
+    pill = ('<span class="pill bad">High Risk</span>' if ent["RiskScore"]>=0.66
+            else '<span class="pill warn">Medium Risk</span>' if ent["RiskScore"]>=0.33
             else '<span class="pill ok">Low Risk</span>')
     st.markdown('<div class="card"><div>Credit Utilization</div>'
                 f'<div class="metric">{credit_util*100:,.0f}%</div>'
@@ -278,31 +366,40 @@ st.dataframe(
 
 # ===================== CHEQUES & PAYMENTS PANELS =====================
 st.markdown("## <span>Cheques & Payments</span>", unsafe_allow_html=True)
+st.caption("Cheque dates in state and daily balances are simulated from current statuses "
+           "(0, 3 and 10 days after the payment date), not recorded history.")
 top_left, top_right = st.columns([2,1])
 
 with top_left:
     st.markdown("#### Cheques under collection")
-    cuc = client_payments.query("Method=='cheque' and Status=='under_collection'").copy()
+    cuc = client_payments[client_payments["Status_now"].eq("under_collection")]
     if cuc.empty:
         st.info("No cheques under collection.")
     else:
-        cuc["Month"] = cuc["Date"].apply(month_start)
-        st.dataframe(cuc[["PaymentNo","Date","Amount","Status"]].style.format({"Amount":"{:,.0f}"}), use_container_width=True)
-        chart = alt.Chart(cuc).mark_bar().encode(
-            x=alt.X("yearmonth(Date):T", title=None),
-            y=alt.Y("sum(Amount):Q", title="Amount"),
-            tooltip=["yearmonth(Date):T","sum(Amount):Q"]
-        ).properties(height=220)
-        st.altair_chart(chart, use_container_width=True)
+        st.dataframe(cuc[["PaymentNo","Date","Amount","Since (simulated)","Days (simulated)"]]
+                     .style.format({"Amount":"{:,.0f}","Since (simulated)":"{:%Y-%m-%d}","Days (simulated)":"{:.0f}"}),
+                     use_container_width=True)
+    held = (cheque_days[["in_treasury", "under_collection"]].rename_axis("Day").reset_index()
+            .melt(id_vars="Day", var_name="State", value_name="Amount"))
+    chart = alt.Chart(held).mark_area(opacity=0.7).encode(
+        x=alt.X("Day:T", title=None),
+        y=alt.Y("Amount:Q", title="Held in cheques (simulated)", stack=True),
+        color=alt.Color("State:N", scale=alt.Scale(domain=["in_treasury", "under_collection"],
+                                                   range=["#93c5fd", "#2563EB"])),
+        tooltip=["Day:T", "State", alt.Tooltip("Amount:Q", format=",.0f")]
+    ).properties(height=220)
+    st.altair_chart(chart, use_container_width=True)
 
 with top_right:
     st.markdown("#### Cheques in treasury")
-    cit = client_payments.query("Method=='cheque' and Status=='in_treasury'")
+    cit = client_payments[client_payments["Status_now"].eq("in_treasury")]
     if cit.empty:
         st.info("No cheques in treasury.")
     else:
-        st.dataframe(cit[["PaymentNo","Date","Amount"]].style.format({"Amount":"{:,.0f}"}), use_container_width=True)
-        st.markdown(f"**Total:** {money(cit['Amount'].sum())} {CURRENCY}")
+        st.dataframe(cit[["PaymentNo","Date","Amount","Days (simulated)"]]
+                     .style.format({"Amount":"{:,.0f}","Days (simulated)":"{:.0f}"}),
+                     use_container_width=True)
+        st.markdown(f"**Total:** {money(cheque_days['in_treasury'].iloc[-1])} {CURRENCY}")
 
 mid_left, mid_mid, mid_right = st.columns(3)
 with mid_left:
@@ -312,15 +409,21 @@ with mid_left:
                  .style.format({"Amount":"{:,.0f}"}), use_container_width=True)
 with mid_mid:
     st.markdown("#### Cheque handover (to suppliers)")
-    handover = supplier_payments.query("Method=='cheque'")
-    st.dataframe(handover[["PaymentNo","Date","Amount","Status","Counterparty"]]
+    handover = supplier_payments[supplier_payments["Status_now"].notna()]
+    st.dataframe(handover[["PaymentNo","Date","Amount","Status_now","Days (simulated)","Counterparty"]]
+                 .rename(columns={"Status_now":"Status"})
                  .sort_values("Date")
-                 .style.format({"Amount":"{:,.0f}"}), use_container_width=True)
+                 .style.format({"Amount":"{:,.0f}","Days (simulated)":"{:.0f}"}), use_container_width=True)
 with mid_right:
     st.markdown("#### Quick status")
     st.markdown('<div class="card">'
                 f'<div>Cheques UC</div><div class="metric">{money(Cheques_UC)} {CURRENCY}</div>'
                 f'<div class="metric-sub">in treasury: {money(Cheques_Treasury)}</div></div>', unsafe_allow_html=True)
+    at_risk = cash_at_risk(cheque_days)
+    st.markdown('<div class="card" style="margin-top:10px">'
+                f'<div>Cash at risk (uncleared cheques)</div><div class="metric">{money(at_risk.iloc[-1])} {CURRENCY}</div>'
+                f'<div class="metric-sub">simulated peak {money(at_risk.max())} since {months[0]:%b %Y}</div></div>',
+                unsafe_allow_html=True)
 
 # ===================== INVOICES =====================
 st.markdown("## <span>Invoices</span>", unsafe_allow_html=True)
@@ -329,7 +432,7 @@ i_left, i_right = st.columns(2)
 with i_left:
     st.markdown("#### Invoices to Entity (Clients)")
     st.dataframe(
-        client_invoices.assign(Collected=lambda d: d["Amount"]-d["Outstanding"])
+        client_invoices.drop(columns=["Entity"]).assign(Collected=lambda d: d["Amount"]-d["Outstanding"])
                        .style.format({"Amount":"{:,.0f}","Collected":"{:,.0f}","Outstanding":"{:,.0f}"}),
         use_container_width=True
     )
@@ -339,23 +442,60 @@ with i_left:
 with i_right:
     st.markdown("#### Invoices from Entity (Suppliers)")
     st.dataframe(
-        supplier_invoices.assign(Paid=lambda d: d["Amount"]-d["Outstanding"])
+        supplier_invoices.drop(columns=["Entity"]).assign(Paid=lambda d: d["Amount"]-d["Outstanding"])
                          .style.format({"Amount":"{:,.0f}","Paid":"{:,.0f}","Outstanding":"{:,.0f}"}),
         use_container_width=True
     )
     si_tot = supplier_invoices[["Amount","Outstanding"]].sum()
     st.markdown(f"**Totals** — Amount: {money(si_tot['Amount'])} • Outstanding: {money(si_tot['Outstanding'])}")
 
+# ===================== RECONCILIATION =====================
+st.markdown("## <span>Payment Reconciliation</span>", unsafe_allow_html=True)
+RECON_COLS = ["InvoiceNo", "PaymentNo", "Amount", "Match"]
+r_left, r_right = st.columns(2)
+for col, title, recon in ((r_left, "#### Receipts ↔ client invoices", client_recon),
+                          (r_right, "#### Payments ↔ supplier invoices", supplier_recon)):
+    with col:
+        st.markdown(title)
+        if recon.empty:
+            st.info("Nothing to reconcile.")
+            continue
+        by_rule = recon.groupby("Match", sort=False)["Amount"].sum()
+        st.markdown(" • ".join(f"**{rule}:** {money(v)}" for rule, v in by_rule.items()))
+        st.dataframe(recon[RECON_COLS].style.format({"Amount":"{:,.0f}"}), use_container_width=True, hide_index=True)
+
+# ===================== AGING =====================
+st.markdown("## <span>AR / AP Aging</span>", unsafe_allow_html=True)
+as_of = st.date_input("Aging as of", value=AS_OF, key="aging_as_of")
+aging_all = aging_table(DEMO_ENTITIES, as_of)
+ent_aging = (aging_all.loc[entity_name] if entity_name in aging_all.index
+             else pd.Series(0.0, index=aging_all.columns))
+aging_view = pd.DataFrame({"AR": ent_aging["AR"], "AP": ent_aging["AP"]})
+a_left, a_right = st.columns([1, 2])
+with a_left:
+    st.dataframe(aging_view.style.format("{:,.0f}"), use_container_width=True)
+with a_right:
+    aging_long = (aging_view.loc[AGING_BUCKETS].rename_axis("Bucket").reset_index()
+                  .melt(id_vars="Bucket", var_name="Side", value_name="Amount"))
+    chart = alt.Chart(aging_long).mark_bar().encode(
+        x=alt.X("Bucket:N", sort=AGING_BUCKETS, title="Days past due"),
+        xOffset="Side:N",
+        y=alt.Y("Amount:Q", title=None),
+        color=alt.Color("Side:N", scale=alt.Scale(domain=["AR", "AP"], range=["#2563EB", "#F59E0B"])),
+        tooltip=["Side", "Bucket", alt.Tooltip("Amount:Q", format=",.0f")]
+    ).properties(height=260)
+    st.altair_chart(chart, use_container_width=True)
+
 # ===================== DUES TOTALS =====================
 st.markdown("## <span>Dues — Totals by Item</span>", unsafe_allow_html=True)
 d_left, d_right = st.columns(2)
 with d_left:
     st.markdown("#### Client-side dues")
-    st.dataframe(client_dues_items.style.format({"Amount":"{:,.0f}"}), use_container_width=True)
+    st.dataframe(client_dues_items.drop(columns=["Entity"]).style.format({"Amount":"{:,.0f}"}), use_container_width=True)
     st.markdown(f"**Total Clients Dues:** {money(client_dues_items['Amount'].sum())} {CURRENCY}")
 with d_right:
     st.markdown("#### Supplier-side dues")
-    st.dataframe(supplier_dues_items.style.format({"Amount":"{:,.0f}"}), use_container_width=True)
+    st.dataframe(supplier_dues_items.drop(columns=["Entity"]).style.format({"Amount":"{:,.0f}"}), use_container_width=True)
     st.markdown(f"**Total Suppliers Dues:** {money(supplier_dues_items['Amount'].sum())} {CURRENCY}")
 
 # ===================== OPERATIONS: Contracts / POs / RFQs / Offers =====================
@@ -364,19 +504,20 @@ o1, o2, o3 = st.columns([1.2, 1, 1])
 
 with o1:
     st.markdown("#### Contracts + (original / executed / pending)")
-    st.dataframe(contracts.style.format({"Amount":"{:,.0f}"}), use_container_width=True)
+    st.dataframe(contracts.drop(columns=["Entity"]).style.format({"Amount":"{:,.0f}"}), use_container_width=True)
     st.markdown(f"**Total Contracts Amount:** {money(contracts['Amount'].sum())} {CURRENCY}")
 
 with o2:
     st.markdown("#### Purchase Orders")
-    st.dataframe(purchase_orders.style.format({"Amount":"{:,.0f}"}), use_container_width=True)
-    st.markdown(f"**Open PO Amount:** {money(purchase_orders.query('Status==\"Open\"')['Amount'].sum())}")
+    st.dataframe(purchase_orders.drop(columns=["Entity"]).style.format({"Amount":"{:,.0f}"}), use_container_width=True)
+    open_po = purchase_orders.query("Status=='Open'")["Amount"].sum()
+    st.markdown(f"**Open PO Amount:** {money(open_po)}")
 
 with o3:
     st.markdown("#### RFQs / Offers")
-    st.dataframe(rfqs.style.format({"QuotedAmount":"{:,.0f}"}), use_container_width=True)
+    st.dataframe(rfqs.drop(columns=["Entity"]).style.format({"QuotedAmount":"{:,.0f}"}), use_container_width=True)
     won = rfqs.query("Status=='Offer Approved'")["QuotedAmount"].sum()
     lost = rfqs.query("Status=='Offer Failed'")["QuotedAmount"].sum()
     st.markdown(f"**Approved:** {money(won)} &nbsp; • &nbsp; **Failed:** {money(lost)}")
 
-st.caption("Static demo data. Replace the DATA block with your ERP API results (keep column names to reuse these visuals).")
+st.caption("Demo data (one static entity + generated counterparties). Replace the DATA block with your ERP API results (keep column names to reuse these visuals).")
@@ -0,0 +1,7 @@
+# tests/conftest.py
+# The app modules live at the repo root (Streamlit puts it on sys.path); do the same for pytest
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
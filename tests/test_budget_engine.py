@@ -0,0 +1,73 @@
+# tests/test_budget_engine.py
+
+import numpy as np
+import pandas as pd
+
+from budget_engine import BudgetCube, generate_sample_data
+
+def _facts(rows):
+    return pd.DataFrame(rows, columns=["Budget", "Version", "Item", "Month", "Planned", "Actual"]).assign(
+        Month=lambda d: pd.to_datetime(d["Month"]))
+
+def test_has_rows_checks_items_and_months_together():
+    cube = BudgetCube(_facts([
+        ["Company", "V1", "Fuel", "2025-01-01", 1.0, 0.0],
+        ["Company", "V1", "Rent", "2025-06-01", 2.0, 0.0],
+    ]))
+    pins = {"Company": "V1"}
+    assert cube.has_rows(pins, "2025-01-01", "2025-03-01", ["Fuel"])
+    # Rent has rows and the window has rows, but not Rent inside the window
+    assert not cube.has_rows(pins, "2025-01-01", "2025-03-01", ["Rent"])
+    assert cube.has_rows(pins, "2025-01-01", "2025-06-01", ["Rent"])
+
+def _sample():
+    df = generate_sample_data(n_budgets=3, n_versions=4, n_items=5, n_months=14, seed=1)
+    rng = np.random.default_rng(1)
+    df = df[rng.random(len(df)) < 0.7]                         # sparse cells
+    return pd.concat([df, df.sample(50, random_state=1)], ignore_index=True)  # repeated cells are summed
+
+def _observed(df):
+    return df.assign(Budget=df["Budget"].astype(str), Version=df["Version"].astype(str), Item=df["Item"].astype(str))
+
+def test_slice_matches_groupby():
+    df = _sample()
+    cube = BudgetCube(df)
+    items = ["Fuel", "Salaries", "Marketing"]
+    sel = cube.slice("Project A", "V3", "2024-03-01", "2024-10-01", items)
+
+    rows = _observed(df)
+    rows = rows[(rows["Budget"] == "Project A") & (rows["Version"] == "V3") & rows["Item"].isin(items)
+                & rows["Month"].between("2024-03-01", "2024-10-01")]
+    want = rows.groupby(["Month", "Item"])["Planned"].sum().unstack(fill_value=0)
+    got = sel.item_month("Planned")
+    pd.testing.assert_frame_equal(got.loc[want.index, want.columns], want, check_dtype=False, check_names=False)
+    assert got.drop(index=want.index, errors="ignore").to_numpy().sum() == 0
+    assert got.drop(columns=want.columns, errors="ignore").to_numpy().sum() == 0
+    np.testing.assert_allclose(sel.by_item().set_index("Item")["Actual"].reindex(want.columns),
+                               rows.groupby("Item")["Actual"].sum().reindex(want.columns))
+
+def test_rollup_matches_groupby():
+    df = _sample()
+    cube = BudgetCube(df)
+    pins = {"Company": "V4", "Project A": "V2", "Project B": "V1"}
+    sel = cube.rollup(pins, "2024-02-01", "2024-12-01")
+
+    rows = _observed(df)
+    pinned = rows[rows["Version"] == rows["Budget"].map(pins)]
+    pinned = pinned[pinned["Month"].between("2024-02-01", "2024-12-01")]
+    want = pinned.groupby("Month")[["Planned", "Actual"]].sum()
+    got = sel.by_month()
+    np.testing.assert_allclose(got.loc[want.index].to_numpy(), want.to_numpy())
+    assert cube.latest_versions(list(pins)) == {b: "V4" for b in pins}
+    assert cube.versions_for("Company") == ["V4", "V3", "V2", "V1"]
+
+def test_compare_versions_matches_groupby():
+    df = _sample()
+    cube = BudgetCube(df)
+    got = cube.compare_versions("Company", "V1", "V3").set_index(["Item", "Month"])["Delta"]
+    rows = _observed(df)
+    rows = rows[rows["Budget"] == "Company"]
+    by = rows.groupby(["Version", "Item", "Month"])["Planned"].sum()
+    want = by.loc["V3"].sub(by.loc["V1"], fill_value=0.0)
+    np.testing.assert_allclose(got.reindex(want.index).to_numpy(), want.to_numpy())
+    assert got.drop(want.index).abs().sum() == 0
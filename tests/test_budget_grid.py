@@ -0,0 +1,49 @@
+# tests/test_budget_grid.py
+
+import numpy as np
+import pandas as pd
+
+from budget_grid import BudgetGrid, GridTotals, profile_weights, spread_totals
+
+def test_update_patches_cell_after_recompute():
+    df = pd.DataFrame({"Item": ["A", "B"], "2025-01": [1.0, 2.0], "2025-02": [3.0, 4.0]})
+    months = ["2025-01", "2025-02"]
+    totals = GridTotals()
+    totals.recompute(df, months)
+    assert totals.values.flags.writeable
+
+    df.loc[1, "2025-02"] = 10.0
+    totals.update(df, months, changed_cells=[(1, "2025-02")])
+    np.testing.assert_allclose(totals.row, [4.0, 12.0])
+    np.testing.assert_allclose(totals.month, [3.0, 13.0])
+
+def test_apply_writes_window_in_place_when_rows_unchanged():
+    months = ["2025-01", "2025-02", "2025-03"]
+    df = pd.DataFrame({"Item": ["A", "B"], "2025-01": [1.0, 2.0], "2025-02": [3.0, 4.0], "2025-03": [5.0, 6.0]})
+    grid = BudgetGrid.from_frame(df, months, [])
+    block = grid.values
+    edited = grid.frame(slice(1, 3))
+    edited.loc[0, "2025-03"] = 50.0
+    grid.apply(edited, slice(1, 3))
+    assert grid.values is block
+    np.testing.assert_allclose(grid.values, [[1.0, 3.0, 50.0], [2.0, 4.0, 6.0]])
+
+def test_apply_added_and_deleted_rows():
+    months = ["2025-01", "2025-02"]
+    df = pd.DataFrame({"Item": ["A", "B"], "2025-01": [1.0, 2.0], "2025-02": [3.0, 4.0]})
+    grid = BudgetGrid.from_frame(df, months, [])
+    edited = grid.frame(slice(1, 2)).drop(index=0)
+    edited.loc[2] = ["C", 7.0]
+    grid.apply(edited, slice(1, 2))
+    assert grid.meta["Item"].tolist() == ["B", "C"]
+    np.testing.assert_allclose(grid.values, [[2.0, 4.0], [0.0, 7.0]])
+
+def test_spread_treats_empty_totals_and_weights_as_zero():
+    months = ["2025-01", "2025-02", "2025-03", "2025-04"]
+    codes = [0, 0, 1, 1]
+    seasonal = np.ones(12)
+    seasonal[0] = np.nan
+    weights = profile_weights("Seasonal", months, seasonal=seasonal, period_codes=codes)
+    out = spread_totals([[30.0, np.nan], [np.nan, 8.0]], weights, codes)
+    assert np.isfinite(out).all()
+    np.testing.assert_allclose(out, [[0.0, 30.0, 0.0, 0.0], [0.0, 0.0, 4.0, 4.0]])
@@ -0,0 +1,44 @@
+# tests/test_budget_io.py
+
+import io
+
+import pandas as pd
+import pytest
+
+from budget_io import budget_json_bytes, read_budget_export, read_budget_template
+
+MONTHS = ["2025-01", "2025-02"]
+
+def test_csv_non_numeric_month_cell_is_coerced_and_reported():
+    data = b"Item,2025-01,2025-02\nFuel,\"1,200\",abc\nRent,5,6\n"
+    grid, problems = read_budget_template(io.BytesIO(data), "budget.csv", MONTHS, [], set(), chunk_rows=1)
+    assert grid is not None
+    assert grid["2025-01"].tolist() == [1200.0, 5.0]
+    assert grid["2025-02"].tolist() == [0.0, 6.0]
+    assert any("non-numeric month cells" in p for p in problems)
+
+def test_corrupt_xlsx_is_reported_not_raised():
+    grid, problems = read_budget_template(io.BytesIO(b"not a workbook"), "budget.xlsx", MONTHS, [], set())
+    assert grid is None
+    assert problems and problems[0].startswith("Could not parse the file")
+
+@pytest.mark.parametrize("data, name, message", [
+    (b"{not json", "budget.json", "Could not read the JSON file"),
+    (b"[1, 2]", "budget.json", "not a budget export"),
+    (b'{"meta": {}}', "budget.json", "missing columns: Month, Item, Planned"),
+    (b'{"layout": "columns", "data": {"Month": ["2025-01-01"], "Item": ["Fuel"]}}', "budget.json",
+     "missing columns: Planned"),
+    (b"not parquet", "budget.parquet", "Could not read the Parquet file"),
+])
+def test_malformed_export_raises_value_error(data, name, message):
+    with pytest.raises(ValueError, match=message):
+        read_budget_export(data, name)
+
+def test_export_round_trip():
+    meta = {"budget_name": "Company", "version": "V1", "currency": "EGP"}
+    long_df = pd.DataFrame({"Budget": "Company", "Version": "V1", "Month": pd.to_datetime(["2025-01-01", "2025-02-01"]),
+                            "Item": ["Fuel", "Fuel"], "Planned": [1.0, 2.0]})
+    back, back_meta = read_budget_export(budget_json_bytes(long_df, meta), "budget.json")
+    assert back_meta == meta
+    assert back["Planned"].tolist() == [1.0, 2.0] and back["Budget"].eq("Company").all()
+    assert back["Month"].tolist() == long_df["Month"].tolist()
@@ -0,0 +1,29 @@
+# tests/test_budget_merge.py
+
+import budget_merge
+from budget_merge import merge_uploads
+
+MONTHS = ["2025-01", "2025-02"]
+META = {"budget_name": "Company", "version": "V1", "budget_type": "Company", "currency": "EGP"}
+
+def test_unreadable_file_is_rejected_and_the_rest_merged(monkeypatch):
+    files = [("ops.csv", b"Item,2025-01,2025-02\nFuel,1,2\n"), ("bad.xlsx", b"not a workbook")]
+    merged, report, cross = merge_uploads(files, MONTHS, [], set(), META, max_workers=1)
+    assert report["Status"].tolist() == ["merged", "rejected"]
+    assert report.loc[1, "Notes"].startswith("Could not parse the file")
+    assert set(merged["Department"]) == {"ops"} and merged["Planned"].sum() == 3.0
+
+    def boom(*args, **kwargs):
+        raise RuntimeError("reader crashed")
+
+    monkeypatch.setattr(budget_merge, "read_budget_template", boom)
+    _, report, _ = merge_uploads(files[:1], MONTHS, [], set(), META, max_workers=1)
+    assert report["Status"].tolist() == ["rejected"]
+    assert "reader crashed" in report.loc[0, "Notes"]
+
+def test_cross_department_duplicates_are_reported():
+    files = [("ops.csv", b"Item,CostCenter,2025-01,2025-02\nFuel,CC-1,1,2\n"),
+             ("eng.csv", b"Item,CostCenter,2025-01,2025-02\nRent,CC-1,3,4\n")]
+    _, report, cross = merge_uploads(files, MONTHS, ["CostCenter"], set(), META, max_workers=1)
+    assert report["Status"].tolist() == ["merged", "merged"]
+    assert cross == {"CostCenter": [("CC-1", ["ops row 1", "eng row 1"])]}
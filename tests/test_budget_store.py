@@ -0,0 +1,66 @@
+# tests/test_budget_store.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from budget_store import SNAPSHOT_EVERY, BudgetStore
+
+def _version(version, planned, budget="Company"):
+    """Long frame for one version: {(month, item): planned}."""
+    keys = list(planned)
+    return pd.DataFrame({"Budget": budget, "Version": version,
+                         "Month": pd.to_datetime([m for m, _ in keys]), "Item": [i for _, i in keys],
+                         "Planned": list(planned.values())})
+
+def _cells(df):
+    return {(m.strftime("%Y-%m-%d"), i): p for m, i, p in zip(df["Month"], df["Item"].astype(str), df["Planned"])}
+
+@pytest.fixture
+def store(tmp_path):
+    return BudgetStore(tmp_path / "budgets.db")
+
+def test_round_trip_with_deltas_and_deletions(store):
+    v1 = {("2025-01-01", "Fuel"): 10.0, ("2025-01-01", "Rent"): 20.0, ("2025-02-01", "Fuel"): 30.0}
+    v2 = {("2025-01-01", "Fuel"): 10.0, ("2025-02-01", "Fuel"): 35.0, ("2025-03-01", "Salaries"): 5.0}  # Rent dropped
+    store.save_version(_version("V1", v1))
+    stored = store.save_version(_version("V2", v2))
+    assert stored == 3  # Fuel Feb changed, Salaries added, Rent deleted
+
+    versions = store.list_versions().set_index("Version")
+    assert pd.isna(versions.loc["V1", "Parent"]) and versions.loc["V2", "Parent"] == "V1"
+    assert _cells(store.load({"Company": "V1"})) == v1
+    assert _cells(store.load({"Company": "V2"})) == v2
+    assert store.load({}).empty
+
+    full = store.load()
+    assert len(full) == len(v1) + len(v2)
+    assert list(full.columns) == ["Budget", "Version", "Item", "Month", "Planned", "Actual"]
+
+def test_resave_parent_keeps_children_intact(store):
+    v1 = {("2025-01-01", "Fuel"): 1.0, ("2025-01-01", "Rent"): 2.0}
+    v2 = {("2025-01-01", "Fuel"): 1.0, ("2025-01-01", "Rent"): 4.0}
+    store.save_version(_version("V1", v1))
+    store.save_version(_version("V2", v2))
+    store.save_version(_version("V1", {("2025-01-01", "Fuel"): 9.0}))
+    assert _cells(store.load({"Company": "V2"})) == v2
+    assert _cells(store.load({"Company": "V1"})) == {("2025-01-01", "Fuel"): 9.0}
+
+def test_snapshot_every_n_versions(store):
+    rng = np.random.default_rng(0)
+    saved = {}
+    for k in range(1, 2 * SNAPSHOT_EVERY + 1):
+        cells = {(f"2025-{m:02d}-01", item): float(rng.integers(0, 3))
+                 for m in range(1, 4) for item in ("Fuel", "Rent") if rng.random() < 0.8}
+        saved[f"V{k}"] = cells
+        store.save_version(_version(f"V{k}", cells))
+    versions = store.list_versions()
+    assert versions["Parent"].isna().sum() == 2  # V1 and the snapshot that restarts the chain
+    full = store.load()
+    for version, cells in saved.items():
+        assert _cells(full[full["Version"] == version]) == cells
+
+def test_data_version_changes_on_save(store):
+    before = store.data_version()
+    store.save_version(_version("V1", {("2025-01-01", "Fuel"): 1.0}))
+    assert store.data_version() != before
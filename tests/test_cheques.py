@@ -0,0 +1,22 @@
+# tests/test_cheques.py
+
+import pandas as pd
+
+from cheques import CLIENT_CHEQUE_FLOW, ChequeLog, current_state, time_in_state
+
+def _log():
+    return ChequeLog(pd.DataFrame({
+        "Cheque": ["A", "A", "A", "B"],
+        "Date": ["2025-01-01", "2025-01-05", "2025-01-20", "2025-01-10"],
+        "Status": ["in_treasury", "under_collection", "collected", "in_treasury"],
+    }))
+
+def test_state_ignores_events_after_as_of():
+    state = current_state(_log(), "2025-01-07")
+    assert list(state.index) == ["A"]          # B has no event yet
+    assert state.loc["A", "Status"] == "under_collection"
+    assert state.loc["A", "Days"] == 2
+
+def test_time_in_state_stops_at_as_of():
+    days = time_in_state(_log(), "2025-01-07").loc["A", CLIENT_CHEQUE_FLOW]
+    assert days.tolist() == [4.0, 2.0, 0.0]
@@ -0,0 +1,85 @@
+# tests/test_ledger.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger import OPEN_INVOICE, UNAPPLIED_PAYMENT, allocate_fifo, reconcile
+
+def _ledgers(seed, n_inv=60, n_pay=40, n_groups=4):
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 90, n_inv + n_pay), unit="D")
+    invoices = pd.DataFrame({
+        "Entity": rng.choice([f"E{g}" for g in range(n_groups)], n_inv),
+        "InvoiceNo": [f"INV-{k}" for k in range(n_inv)],
+        "DueDate": days[:n_inv],
+        "Amount": rng.integers(1, 100, n_inv).astype(float),
+    }, index=pd.Index(np.arange(n_inv) * 10 + 7))
+    payments = pd.DataFrame({
+        "Entity": rng.choice([f"E{g}" for g in range(n_groups)], n_pay),
+        "PaymentNo": [f"PAY-{k}" for k in range(n_pay)],
+        "Date": days[n_inv:],
+        "Amount": rng.integers(1, 150, n_pay).astype(float),
+        "Reference": np.where(rng.random(n_pay) < 0.3, rng.choice(invoices["InvoiceNo"], n_pay), ""),
+    }, index=pd.Index(np.arange(n_pay) * 10 + 3))
+    return invoices, payments
+
+def _fifo_loop(invoices, payments, by):
+    """Reference: walk each group's invoices (by due) and payments (by date) one unit of money at a time."""
+    allocated = pd.Series(0.0, index=invoices.index)
+    pairs = {}
+    for g in pd.unique(pd.concat([invoices[by], payments[by]])):
+        inv = invoices[invoices[by] == g].sort_values("DueDate", kind="stable")
+        pay = payments[payments[by] == g].sort_values("Date", kind="stable")
+        inv_left = list(inv["Amount"])
+        k = 0
+        for p_label, p_amt in pay["Amount"].items():
+            while p_amt > 0 and k < len(inv):
+                take = min(p_amt, inv_left[k])
+                if take > 0:
+                    allocated[inv.index[k]] += take
+                    pairs[(p_label, inv.index[k])] = pairs.get((p_label, inv.index[k]), 0.0) + take
+                p_amt -= take
+                inv_left[k] -= take
+                if inv_left[k] <= 0:
+                    k += 1
+    return allocated, pairs
+
+@pytest.mark.parametrize("seed", range(5))
+def test_allocate_fifo_matches_simple_loop(seed):
+    invoices, payments = _ledgers(seed)
+    allocated, pairs = allocate_fifo(invoices, payments, by="Entity")
+    want_allocated, want_pairs = _fifo_loop(invoices, payments, "Entity")
+    np.testing.assert_allclose(allocated.loc[invoices.index], want_allocated)
+    got = pairs.groupby(["Payment", "Invoice"])["Amount"].sum().to_dict()
+    assert got.keys() == want_pairs.keys()
+    np.testing.assert_allclose([got[k] for k in want_pairs], list(want_pairs.values()))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_reconcile_conserves_amounts(seed):
+    invoices, payments = _ledgers(seed)
+    ledger, applied, unapplied = reconcile(invoices, payments, by="Entity")
+
+    on_invoice = ledger[ledger["Match"] != UNAPPLIED_PAYMENT].groupby("Invoice")["Amount"].sum()
+    on_payment = ledger[ledger["Match"] != OPEN_INVOICE].groupby("Payment")["Amount"].sum()
+    np.testing.assert_allclose(on_invoice.reindex(invoices.index, fill_value=0.0), invoices["Amount"])
+    np.testing.assert_allclose(on_payment.reindex(payments.index, fill_value=0.0), payments["Amount"])
+
+    matched = ledger[ledger["Match"].isin(["reference", "amount", "fifo"])]
+    np.testing.assert_allclose(applied, matched.groupby("Invoice")["Amount"].sum().reindex(invoices.index, fill_value=0.0))
+    np.testing.assert_allclose(unapplied.sum(), ledger.loc[ledger["Match"] == UNAPPLIED_PAYMENT, "Amount"].sum())
+    assert (applied <= invoices["Amount"] + 1e-9).all()
+    # matches never cross entities
+    ent = ledger.dropna(subset=["Payment", "Invoice"])
+    assert (invoices.loc[ent["Invoice"], "Entity"].to_numpy() == payments.loc[ent["Payment"], "Entity"].to_numpy()).all()
+
+def test_reconcile_rule_order():
+    invoices = pd.DataFrame({"InvoiceNo": ["A", "B", "C"], "DueDate": pd.to_datetime(["2025-01-01"] * 3),
+                             "Amount": [100.0, 50.0, 30.0]})
+    payments = pd.DataFrame({"PaymentNo": ["P1", "P2", "P3"], "Date": pd.to_datetime(["2025-02-01"] * 3),
+                             "Amount": [30.0, 50.0, 100.0], "Reference": ["", "", "A"]})
+    ledger, applied, unapplied = reconcile(invoices, payments)
+    rules = dict(zip(ledger["PaymentNo"], ledger["Match"]))
+    assert rules == {"P3": "reference", "P1": "amount", "P2": "amount"}
+    assert dict(zip(ledger["PaymentNo"], ledger["InvoiceNo"])) == {"P3": "A", "P1": "C", "P2": "B"}
+    assert applied.tolist() == [100.0, 50.0, 30.0] and unapplied.sum() == 0.0